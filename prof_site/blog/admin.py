@@ -1,7 +1,47 @@
 from django.contrib import admin
 from django.contrib.gis import admin
+from django import forms
+from django.contrib import messages
 from markdownx.admin import MarkdownxModelAdmin
-from .models import Award, Conference, ConferenceInstance, Library, Person, Post, Institution, Education, Committee_Membership, Affiliation, CitationStyle, Event, Role,SiteWideSetting
+from .pandoc import citekeys
+from .widgets import ChunkedFileWidget
+from .models import Award, Conference, ConferenceInstance, Library, Person, Post, Institution, Education, Committee_Membership, Affiliation, CitationStyle, Event, Role,SiteWideSetting, RenderJob, ChunkedUpload
+
+class ChunkedUploadForm(object):
+    """
+    Form mixin that rejects upload tokens for unfinished or expired
+    uploads, or for uploads made by a user other than `upload_user`.
+    """
+    upload_user = None
+
+    def clean(self):
+        cleaned_data = super(ChunkedUploadForm, self).clean()
+        for name, field in self.fields.items():
+            widget = field.widget
+            if not isinstance(widget, ChunkedFileWidget) or not getattr(widget, 'token', None):
+                continue
+            if not widget.upload:
+                self.add_error(name, "The upload didn't finish or has expired. Please choose the file again.")
+            elif widget.upload.user_id != getattr(self.upload_user, 'pk', None):
+                widget.upload = None
+                self.add_error(name, "That upload belongs to another user.")
+        return cleaned_data
+
+class ChunkedUploadMixin(object):
+    """
+    Uses the resumable chunked upload widget for the fields named in
+    `chunked_fields`, accepting only uploads made by the requesting user.
+    """
+    chunked_fields = ()
+
+    def formfield_for_dbfield(self, db_field, request, **kwargs):
+        if db_field.name in self.chunked_fields:
+            kwargs['widget'] = ChunkedFileWidget
+        return super(ChunkedUploadMixin, self).formfield_for_dbfield(db_field, request, **kwargs)
+
+    def get_form(self, request, obj=None, **kwargs):
+        form = super(ChunkedUploadMixin, self).get_form(request, obj, **kwargs)
+        return type(form.__name__, (ChunkedUploadForm, form), {'upload_user': request.user})
 
 class AffiliationInline(admin.TabularInline):
     model = Affiliation
@@ -11,7 +51,8 @@ class EducationInline(admin.TabularInline):
     model = Education
     extra = 1
 
-class PersonAdmin(admin.ModelAdmin):
+class PersonAdmin(ChunkedUploadMixin, admin.ModelAdmin):
+    chunked_fields = ('vita',)
     inlines = (EducationInline, AffiliationInline,)
 
 class CommitteeInline(admin.TabularInline):
@@ -28,13 +69,60 @@ class RoleInline(admin.TabularInline):
 class EventAdmin(admin.ModelAdmin):
     inlines = (RoleInline,)
 
-class PostAdmin(admin.ModelAdmin):
+class LibraryAdmin(admin.ModelAdmin):
+    list_display = ('name', 'version', 'sync_state', 'last_synced', 'item_count')
+    actions = ['rollback']
+    readonly_fields = (
+        'version', 'bib_file', 'json_file', 'sync_state', 'last_synced',
+        'sync_duration', 'item_count', 'sync_error'
+    )
+
+    def rollback(self, request, queryset):
+        for library in queryset:
+            library.queue_renders(library.rollback())
+    rollback.short_description = "Roll back to the previous bibliography"
+
+class PostAdminForm(forms.ModelForm):
+    def clean_content(self):
+        """
+        Notes citations missing from the site bibliography. They don't
+        block saving: Zotero syncs in the background, so an item added
+        since the last sync is missing until the next one.
+        """
+        content = self.cleaned_data['content']
+        self.library = SiteWideSetting.render_args()[2]
+        self.missing_keys = set()
+        if self.library:
+            self.missing_keys = self.library.missing_keys(citekeys(content))
+        return content
+
+class PostAdmin(ChunkedUploadMixin, admin.ModelAdmin):
+    form = PostAdminForm
+    chunked_fields = ('attach', 'bib')
     autocomplete_lookup_fields = {
         'generic': [['content_type', 'object_id']],
     }
 
+    def save_model(self, request, obj, form, change):
+        """
+        Warns about citations missing from the site bibliography and
+        queues a sync, which re-renders the post if they turn up.
+        """
+        super(PostAdmin, self).save_model(request, obj, form, change)
+        if getattr(form, 'missing_keys', None):
+            # The form's library is the shared sitewide instance: only
+            # touch sync_state, and leave a sync that's running alone.
+            Library.objects.filter(pk=form.library.pk).exclude(
+                sync_state='R',
+                modified_at__gte=Library.stale_before()
+            ).update(sync_state='Q')
+            messages.warning(request,
+                "Not in the site bibliography yet: %s. A Zotero sync has been queued."
+                % ', '.join(sorted(form.missing_keys))
+            )
+
 # Register your models here.
-admin.site.register(Library)
+admin.site.register(Library, LibraryAdmin)
 admin.site.register(Award)
 admin.site.register(Conference)
 admin.site.register(ConferenceInstance)
@@ -45,3 +133,5 @@ admin.site.register(SiteWideSetting)
 admin.site.register(Institution, admin.OSMGeoAdmin)
 admin.site.register(Post, PostAdmin)
 admin.site.register(CitationStyle)
+admin.site.register(RenderJob)
+admin.site.register(ChunkedUpload)
@@ -1,5 +1,4 @@
-from .models import Person, SiteWideSetting
+from . import sitewide
 
 def main_author(request):
-    main_person_id = SiteWideSetting.objects.all()[0].main_person.id
-    return {'main_author': Person.objects.filter(id=main_person_id)[0]}
\ No newline at end of file
+    return {'main_author': sitewide.main_person()}
\ No newline at end of file
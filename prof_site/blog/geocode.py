@@ -1,13 +1,88 @@
 from opencage.geocoder import OpenCageGeocode
 from django.conf import settings
 from django.contrib.gis.geos import Point
+from django.db.models import Q
+from django.utils import timezone
+from datetime import timedelta
+from re import sub
 
 def geocode_address(query):
     gc = OpenCageGeocode(settings.OPENCAGE_KEY)
+    gc.url = settings.OPENCAGE_URL
     result = gc.geocode(query, no_annotations=1)
     if result and len(result):
         lng = result[0]['geometry']['lng']
         lat  = result[0]['geometry']['lat']
         return Point(lng, lat, srid=4326)
     else:
-        return None
\ No newline at end of file
+        return None
+
+def address_query(address, city, state, postal, country):
+    """
+    Joins address parts into a geocoding query.
+    """
+    return ','.join(filter(None, [address, city, state, postal, country]))
+
+def normalize_query(query):
+    """
+    Case- and whitespace-insensitive form of a query, used as cache key.
+    """
+    return ','.join(
+        sub(r'\s+', ' ', part).strip().lower() for part in query.split(',') if part.strip()
+    )
+
+def gazetteer(city, state, country):
+    """
+    Looks a city up in the local gazetteer, preferring the most
+    populous match. Returns None if it isn't there.
+    """
+    from .models import Place
+    if not city:
+        return None
+    places = Place.objects.filter(name__iexact=city)
+    if state:
+        places = places.filter(Q(admin1__iexact=state) | Q(admin1_code__iexact=state))
+    if country:
+        places = places.filter(Q(country__iexact=country) | Q(country_code__iexact=country))
+    place = places.order_by('-population').first()
+    return place.location if place else None
+
+def cached(key):
+    """
+    Looks a normalized query up in the geocode cache.
+    Returns (hit, location); location is None for cached failures.
+    """
+    from .models import GeocodeCache
+    hit = GeocodeCache.objects.filter(query=key, expires_at__gt=timezone.now()).first()
+    return (True, hit.location) if hit else (False, None)
+
+def remember(key, location):
+    """
+    Caches the location found for a normalized query.
+    """
+    from .models import GeocodeCache
+    ttl = settings.GEOCODE_TTL if location else settings.GEOCODE_NEGATIVE_TTL
+    GeocodeCache.objects.update_or_create(
+        query=key,
+        defaults={'location': location, 'expires_at': timezone.now() + timedelta(days=ttl)}
+    )
+
+def geocode(address, city, state, postal, country):
+    """
+    Geocodes an address through the persistent cache. City-level
+    queries are answered by the gazetteer when possible; only misses go
+    out to OpenCage. Failed lookups are cached too, for a shorter time.
+    """
+    query = address_query(address, city, state, postal, country)
+    key = normalize_query(query)
+    if not key:
+        return None
+    hit, location = cached(key)
+    if hit:
+        return location
+    if not address:
+        location = gazetteer(city, state, country)
+    if location is None:
+        location = geocode_address(query)
+    remember(key, location)
+    return location
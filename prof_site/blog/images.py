@@ -0,0 +1,115 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from imagekit.cachefiles import ImageCacheFile
+from imagekit.processors import ResizeToFit
+from imagekit.specs import ImageSpec
+from PIL import Image
+from .models import Person, Post
+
+# Source image field and the imagekit specs generated from it.
+SPECS = {
+    Post: ('banner', ['banner_thumb', 'banner_reduced']),
+    Person: ('photo', ['photo_thumb', 'photo_gray']),
+}
+
+# Responsive variant formats, best first, with their MIME types.
+VARIANT_FORMATS = [('AVIF', 'image/avif'), ('WEBP', 'image/webp'), ('JPEG', 'image/jpeg')]
+
+def variant_formats():
+    """
+    The variant formats this Pillow build can encode. AVIF needs
+    Pillow 11.3 or later built with libavif; JPEG is always there.
+    """
+    Image.init()
+    return [(f, mime) for f, mime in VARIANT_FORMATS if f in Image.SAVE]
+
+class Variant(ImageSpec):
+    """
+    A source image scaled down to a width, in a given format.
+    """
+    options = {'quality': 70}
+
+    def __init__(self, source, width, format):
+        self.processors = [ResizeToFit(width=width, upscale=False)]
+        self.format = format
+        super(Variant, self).__init__(source=source)
+
+def variants(image):
+    """
+    Generates the width ladder of an image in every variant format.
+    Returns {mime type: [[width, url], ...]}, narrowest first. Widths
+    beyond the source are capped at its own width.
+    """
+    widths = sorted({min(w, image.width) for w in settings.IMAGE_WIDTHS})
+    ladder = {}
+    for format, mime in variant_formats():
+        ladder[mime] = []
+        for width in widths:
+            file = ImageCacheFile(Variant(image, width, format))
+            file.generate()
+            ladder[mime].append([width, file.storage.url(file.name)])
+    return ladder
+
+def claim(model, limit):
+    """
+    Mark up to `limit` rows whose images have not been generated as
+    generating and return them. Rows locked by other workers are skipped.
+    The claim records when it was made, so rows left generating by a
+    worker that died are claimed again after IMAGE_TIMEOUT minutes.
+    """
+    source, _ = SPECS[model]
+    stale = time.time() - settings.IMAGE_TIMEOUT * 60
+    with transaction.atomic():
+        rows = list(model.objects.select_for_update(
+                skip_locked=True
+            ).filter(
+                Q(image_manifest={}) | Q(image_manifest__generating__lt=stale)
+            ).exclude(
+                **{source: ''}
+            ).exclude(
+                **{source + '__isnull': True}
+            ).order_by('pk')[:limit])
+        model.objects.filter(pk__in=[r.pk for r in rows]).update(image_manifest={'generating': time.time()})
+    return rows
+
+def generate(instance):
+    """
+    Generates every spec and responsive variant of an instance's source
+    image and returns the manifest: the source name, the URL of each
+    spec and the variant ladders. A failure is recorded instead, so the
+    row is not retried until the image changes.
+    """
+    source, specs = SPECS[type(instance)]
+    manifest = {'source': getattr(instance, source).name}
+    try:
+        for spec in specs:
+            file = getattr(instance, spec)
+            file.generate()
+            manifest[spec] = file.storage.url(file.name)
+        manifest['variants'] = variants(getattr(instance, source))
+    except Exception as e:
+        return {'source': manifest['source'], 'error': repr(e)}
+    return manifest
+
+def work(workers, batch=None):
+    """
+    Claim rows with new images and generate their specs across `workers`
+    threads. The manifest is only written if the source image is still
+    the one generated from. Returns the number of rows processed.
+    """
+    done = 0
+    for model, (source, _) in SPECS.items():
+        rows = claim(model, batch or workers * 4)
+        if not rows:
+            continue
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            manifests = list(pool.map(generate, rows))
+        for row, manifest in zip(rows, manifests):
+            model.objects.filter(
+                    pk=row.pk, **{source: manifest['source']}
+                ).update(image_manifest=manifest)
+        done += len(rows)
+    return done
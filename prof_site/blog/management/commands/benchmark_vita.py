@@ -0,0 +1,40 @@
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import JsonResponse
+from django.test.utils import CaptureQueriesContext
+from blog.vita import fast_vita_data, vita_data
+
+class Command(BaseCommand):
+    help = "Compare the DRF and .values() vita serializers for speed and identical output."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--runs',
+            type=int,
+            default=50,
+            help="Number of times to build the vita with each serializer."
+        )
+
+    def measure(self, build, runs):
+        with CaptureQueriesContext(connection) as queries:
+            body = build()
+        start = time.perf_counter()
+        for _ in range(runs):
+            build()
+        return body, len(queries), (time.perf_counter() - start) / runs
+
+    def handle(self, *args, **options):
+        runs = options['runs']
+        try:
+            drf, drf_queries, drf_time = self.measure(lambda: JsonResponse(vita_data()).content, runs)
+            fast, fast_queries, fast_time = self.measure(lambda: json.dumps(fast_vita_data()).encode('utf-8'), runs)
+        except IndexError:
+            raise CommandError("No main person is configured.")
+        self.stdout.write("DRF:    {:8.2f} ms, {} queries".format(drf_time * 1000, drf_queries))
+        self.stdout.write("values: {:8.2f} ms, {} queries".format(fast_time * 1000, fast_queries))
+        self.stdout.write("Speedup: {:.1f}x ({} bytes)".format(drf_time / fast_time, len(fast)))
+        if drf != fast:
+            raise CommandError("Outputs differ.")
+        self.stdout.write(self.style.SUCCESS("Outputs are byte-identical."))
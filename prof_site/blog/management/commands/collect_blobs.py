@@ -0,0 +1,34 @@
+import time
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from blog.storage import ContentAddressedStorage, referenced_blobs
+
+class Command(BaseCommand):
+    help = "Remove stored uploads no record refers to any more (e.g., from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=float,
+            default=24,
+            help="Hours a file must have been stored before it may be removed."
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="List the files that would be removed without removing them."
+        )
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError("DEFAULT_FILE_STORAGE is not the content-addressed storage.")
+        removed, freed = default_storage.collect(
+            referenced_blobs(),
+            time.time() - options['min_age'] * 3600,
+            dry_run=options['dry_run']
+        )
+        for name in removed:
+            self.stdout.write(name)
+        self.stdout.write("%s %d file(s), freeing %d bytes." % (
+            "Would remove" if options['dry_run'] else "Removed", len(removed), freed
+        ))
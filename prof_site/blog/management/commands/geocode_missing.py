@@ -0,0 +1,96 @@
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Lock
+from django.core.management.base import BaseCommand
+from blog.geocode import address_query, cached, gazetteer, geocode_address, normalize_query, remember
+from blog.models import ConferenceInstance, Institution
+
+class RateLimit:
+    """
+    Spaces calls to wait() at least 1/rate seconds apart across threads.
+    """
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.next = 0.0
+        self.lock = Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next)
+            self.next = slot + self.interval
+        time.sleep(max(0.0, slot - now))
+
+class Command(BaseCommand):
+    help = "Geocode every institution and conference without a location."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=1,
+            help="Maximum geocoder requests per second."
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help="Maximum concurrent geocoder requests."
+        )
+
+    def handle(self, *args, **options):
+        rows = defaultdict(list)
+        queries = {}
+        for model in (Institution, ConferenceInstance):
+            for row in model.objects.filter(location__isnull=True):
+                parts = (row.address, row.city, row.state, row.postal, row.country)
+                key = normalize_query(address_query(*parts))
+                if key:
+                    rows[key].append(row)
+                    queries[key] = parts
+        found = {}
+        remote = []
+        for key, (address, city, state, postal, country) in queries.items():
+            hit, location = cached(key)
+            if not hit and not address:
+                location = gazetteer(city, state, country)
+                if location:
+                    remember(key, location)
+                    hit = True
+            if hit:
+                found[key] = location
+            else:
+                remote.append(key)
+        self.stdout.write("%d row(s), %d distinct queries, %d to geocode." % (
+            sum(len(r) for r in rows.values()), len(queries), len(remote)
+        ))
+        limit = RateLimit(options['rate'])
+
+        def lookup(key):
+            limit.wait()
+            return geocode_address(address_query(*queries[key]))
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {pool.submit(lookup, key): key for key in remote}
+            for n, future in enumerate(as_completed(futures), 1):
+                key = futures[future]
+                try:
+                    found[key] = future.result()
+                except Exception as e:
+                    # Leave transient failures uncached so a re-run retries them.
+                    self.stderr.write("%s: %r" % (key, e))
+                    continue
+                remember(key, found[key])
+                self.stdout.write("[%d/%d] %s" % (n, len(remote), key))
+        updated = defaultdict(list)
+        for key, location in found.items():
+            if location:
+                for row in rows[key]:
+                    row.location = location
+                    updated[type(row)].append(row)
+        for model, changed in updated.items():
+            model.objects.bulk_update(changed, ['location'], batch_size=500)
+        self.stdout.write(self.style.SUCCESS("Located %d row(s)." % sum(
+            len(changed) for changed in updated.values()
+        )))
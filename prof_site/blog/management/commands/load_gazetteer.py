@@ -0,0 +1,70 @@
+import csv
+from django.contrib.gis.gdal import DataSource
+from django.contrib.gis.geos import Point
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from blog.models import Place
+
+FIELDS = ['name', 'admin1', 'admin1_code', 'country', 'country_code', 'population']
+
+class Command(BaseCommand):
+    help = """Load the local gazetteer from a CSV (with name, admin1, admin1_code,
+        country, country_code, population, latitude and longitude columns) or from
+        any point layer GDAL can read (e.g., a GeoPackage) with the same fields."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--layer',
+            default=0,
+            help="Layer to read from a multi-layer source."
+        )
+        parser.add_argument(
+            '--replace',
+            action='store_true',
+            help="Delete the existing gazetteer first."
+        )
+
+    def rows(self, path, layer):
+        if path.lower().endswith('.csv'):
+            with open(path, newline='') as f:
+                for row in csv.DictReader(f):
+                    yield Place(
+                        location=Point(float(row['longitude']), float(row['latitude']), srid=4326),
+                        **self.values(row)
+                    )
+        else:
+            source = DataSource(path)
+            layer = source[int(layer) if str(layer).isdigit() else layer]
+            for feature in layer:
+                geom = feature.geom
+                geom.transform(4326)
+                yield Place(
+                    location=geom.geos,
+                    **self.values({f: feature.get(f) for f in FIELDS if f in layer.fields})
+                )
+
+    def values(self, row):
+        values = {f: (row.get(f) or '') for f in FIELDS}
+        values['population'] = int(values['population'] or 0)
+        return values
+
+    def handle(self, *args, **options):
+        try:
+            rows = self.rows(options['path'], options['layer'])
+            with transaction.atomic():
+                if options['replace']:
+                    Place.objects.all().delete()
+                count = 0
+                batch = []
+                for place in rows:
+                    batch.append(place)
+                    if len(batch) == 1000:
+                        Place.objects.bulk_create(batch)
+                        count += len(batch)
+                        batch = []
+                Place.objects.bulk_create(batch)
+                count += len(batch)
+        except (KeyError, ValueError) as e:
+            raise CommandError("Couldn't read %s: %s" % (options['path'], e))
+        self.stdout.write(self.style.SUCCESS("Loaded %d place(s)." % count))
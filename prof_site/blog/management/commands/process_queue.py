@@ -0,0 +1,42 @@
+import os
+import time
+from django.core.management.base import BaseCommand
+from blog import images, render, sync
+
+class Command(BaseCommand):
+    help = "Work off the render queue, queued Zotero syncs and new images."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help="Number of worker threads."
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Exit once the queue is empty."
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help="Seconds to wait between polls of an empty queue."
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            synced = sync.work()
+            if synced:
+                self.stdout.write("Synced %d library(ies)." % synced)
+            generated = images.work(options['workers'])
+            if generated:
+                self.stdout.write("Generated images for %d object(s)." % generated)
+            done = render.work(options['workers'])
+            if done:
+                self.stdout.write("Rendered %d post(s)." % done)
+            elif not synced and not generated and options['once']:
+                break
+            elif not synced and not generated:
+                time.sleep(options['interval'])
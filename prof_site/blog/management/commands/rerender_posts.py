@@ -0,0 +1,90 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from blog.models import Citation, Post, RenderCache, SiteWideSetting
+from blog.pandoc import citekeys, pandocify
+from blog.render import render_keys, store
+
+def _render(pk, content, csl, bib):
+    start = time.perf_counter()
+    html = pandocify(content=content, csl=csl, bib=bib)
+    return pk, html, time.perf_counter() - start
+
+class Command(BaseCommand):
+    help = "Re-render every post's content across a pool of pandoc processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help="Only posts modified on or after this date (YYYY-MM-DD)."
+        )
+        parser.add_argument(
+            '--only-with-citations',
+            action='store_true',
+            help="Only posts that cite bibliography entries."
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="List the posts that would be rendered without rendering them."
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help="Number of pandoc processes to run at once."
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.only('id', 'title', 'content').order_by('-display_datetime')
+        if options['since']:
+            try:
+                since = datetime.strptime(options['since'], '%Y-%m-%d')
+            except ValueError:
+                raise CommandError("--since must be formatted YYYY-MM-DD.")
+            posts = posts.filter(modified_at__gte=timezone.make_aware(since))
+        if options['only_with_citations']:
+            # The Citation rows Post.save indexes with citekeys().
+            posts = posts.filter(pk__in=Citation.objects.values('post_id'))
+        posts = list(posts)
+        if options['dry_run']:
+            for p in posts:
+                self.stdout.write(p.title)
+            self.stdout.write("%d post(s) would be rendered." % len(posts))
+            return
+        csl, _, library = SiteWideSetting.render_args()
+        titles = {p.pk: p.title for p in posts}
+        keys = render_keys(posts, csl, library)
+        results = {}
+        start = time.perf_counter()
+        # Pruned bibliographies are removed once every render is done.
+        with ExitStack() as bibs, ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {
+                pool.submit(
+                    _render, p.pk, p.content, csl,
+                    bibs.enter_context(library.pruned_bib(citekeys(p.content))) if library else None
+                ): p.pk
+                for p in posts
+            }
+            for n, future in enumerate(as_completed(futures), 1):
+                try:
+                    pk, html, seconds = future.result()
+                except Exception as e:
+                    for f in futures:
+                        f.cancel()
+                    raise CommandError("Rendering %r failed: %s" % (titles[futures[future]], e))
+                results[pk] = html
+                self.stdout.write("[%d/%d] %s (%.2fs)" % (n, len(posts), titles[pk], seconds))
+        # Nothing is written unless every post rendered.
+        with transaction.atomic():
+            for pk, html in results.items():
+                RenderCache.objects.update_or_create(key=keys[pk], defaults={'html': html})
+                store(pk, html)
+        self.stdout.write(self.style.SUCCESS(
+            "Rendered %d post(s) in %.2fs." % (len(results), time.perf_counter() - start)
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from blog.models import Library
+from blog.sync import work
+
+class Command(BaseCommand):
+    help = "Queue every Zotero library for a sync (e.g., from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--now',
+            action='store_true',
+            help="Run the syncs here rather than leaving them to process_queue."
+        )
+
+    def handle(self, *args, **options):
+        queued = Library.objects.exclude(
+                sync_state='R',
+                modified_at__gte=Library.stale_before()
+            ).update(sync_state='Q')
+        self.stdout.write("Queued %d library(ies)." % queued)
+        if options['now']:
+            self.stdout.write("Synced %d library(ies)." % work())
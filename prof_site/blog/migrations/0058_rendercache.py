@@ -0,0 +1,27 @@
+# Generated by Django 3.2.13 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0057_auto_20210331_0933'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RenderCache',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+                ('key', models.CharField(help_text='Hash of content, CSL, bibliography version and pandoc version.', max_length=64, unique=True)),
+                ('html', models.TextField(help_text='Rendered HTML.')),
+            ],
+            options={
+                'verbose_name': 'Render Cache',
+                'verbose_name_plural': 'Render Cache',
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.13 on 2026-10-18 09:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def queue_existing_posts(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    RenderJob = apps.get_model('blog', 'RenderJob')
+    RenderJob.objects.bulk_create(
+        [RenderJob(post_id=pk) for pk in Post.objects.values_list('pk', flat=True)]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0058_rendercache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='html',
+            field=models.TextField(blank=True, default='', editable=False, help_text='Rendered post content (updated by the render queue).'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.TextField(blank=True, default='', editable=False, help_text='Plain-text excerpt of the rendered content.'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='rendered_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='When the post content was last rendered.', null=True),
+        ),
+        migrations.CreateModel(
+            name='RenderJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+                ('state', models.CharField(choices=[('P', 'Pending'), ('R', 'Running'), ('D', 'Done'), ('F', 'Failed')], default='P', help_text='Where is this job in the queue?', max_length=1)),
+                ('error', models.TextField(blank=True, default='', help_text='Error raised by the last attempt, if any.')),
+                ('post', models.ForeignKey(help_text='Post to render.', on_delete=django.db.models.deletion.CASCADE, to='blog.post')),
+            ],
+            options={
+                'verbose_name': 'Render Job',
+                'verbose_name_plural': 'Render Jobs',
+            },
+        ),
+        migrations.RunPython(queue_existing_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 3.2.13 on 2026-10-18 10:31
+
+from re import DOTALL, MULTILINE, compile
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Frozen copy of blog.pandoc.citekeys: migrations must not change
+# behaviour when the app's helpers do.
+citekey_reg = compile(r'(?<![\w@.])-?@(?:\{([^}]+)\}|(\w(?:[\w:.#$%&+?<>~/-]*\w)?))')
+code_reg = compile(
+    r'^(`{3,}|~{3,}).*?(?:^\1[`~]*[ \t]*$|\Z)'
+    r'|(?<!`)(`+)(?!`)(?:(?!\n[ \t]*\n).)+?(?<!`)\2(?!`)',
+    MULTILINE | DOTALL
+)
+
+
+def citekeys(content):
+    return {a or b for a, b in citekey_reg.findall(code_reg.sub(' ', content))}
+
+
+def index_citations(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    Citation = apps.get_model('blog', 'Citation')
+    Citation.objects.bulk_create([
+        Citation(post_id=pk, key=key)
+        for pk, content in Post.objects.values_list('pk', 'content')
+        for key in citekeys(content)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0059_post_render_queue'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='rendercache',
+            name='key',
+            field=models.CharField(help_text='Hash of content, CSL, cited bibliography entries and pandoc version.', max_length=64, unique=True),
+        ),
+        migrations.CreateModel(
+            name='BibEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+                ('key', models.CharField(help_text='BibTeX citekey.', max_length=250)),
+                ('digest', models.CharField(help_text="Hash of the entry's fields.", max_length=64)),
+                ('library', models.ForeignKey(help_text='Library the entry belongs to.', on_delete=django.db.models.deletion.CASCADE, to='blog.library')),
+            ],
+            options={
+                'verbose_name': 'Bibliography Entry',
+                'verbose_name_plural': 'Bibliography Entries',
+                'unique_together': {('library', 'key')},
+            },
+        ),
+        migrations.CreateModel(
+            name='Citation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(db_index=True, help_text='Cited BibTeX citekey.', max_length=250)),
+                ('post', models.ForeignKey(help_text='Citing post.', on_delete=django.db.models.deletion.CASCADE, to='blog.post')),
+            ],
+            options={
+                'verbose_name': 'Citation',
+                'verbose_name_plural': 'Citations',
+                'unique_together': {('post', 'key')},
+            },
+        ),
+        migrations.RunPython(index_citations, migrations.RunPython.noop),
+    ]
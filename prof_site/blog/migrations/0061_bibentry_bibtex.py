@@ -0,0 +1,58 @@
+# Generated by Django 3.2.13 on 2026-10-18 11:05
+
+import bibtexparser
+import json
+import os
+from hashlib import sha256
+from django.conf import settings
+from django.db import migrations, models
+
+
+def bib_entries(bib_file_path):
+    """
+    Frozen copy of blog.zotero_update.bib_entries: maps each citekey in
+    a BibTeX file to its digest and BibTeX.
+    """
+    parser = bibtexparser.bparser.BibTexParser(common_strings=True)
+    with open(bib_file_path) as bibtex_file:
+        database = bibtexparser.loads(bibtex_file.read(), parser=parser)
+    writer = bibtexparser.bwriter.BibTexWriter()
+    entries = {}
+    for entry in database.entries:
+        single = bibtexparser.bibdatabase.BibDatabase()
+        single.entries = [entry]
+        entries[entry['ID']] = (
+            sha256(json.dumps(entry, sort_keys=True).encode('utf-8')).hexdigest(),
+            writer.write(single)
+        )
+    return entries
+
+
+def load_entries(apps, schema_editor):
+    Library = apps.get_model('blog', 'Library')
+    BibEntry = apps.get_model('blog', 'BibEntry')
+    for library in Library.objects.all():
+        path = os.path.join(settings.MEDIA_ROOT, str(library.bib_file))
+        if not library.bib_file or not os.path.exists(path):
+            continue
+        BibEntry.objects.filter(library=library).delete()
+        BibEntry.objects.bulk_create([
+            BibEntry(library=library, key=key, digest=digest, bibtex=bibtex)
+            for key, (digest, bibtex) in bib_entries(path).items()
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0060_citation_bibentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bibentry',
+            name='bibtex',
+            field=models.TextField(blank=True, default='', help_text='The entry as BibTeX.'),
+        ),
+        migrations.RunPython(load_entries, migrations.RunPython.noop),
+    ]
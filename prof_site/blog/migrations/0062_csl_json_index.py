@@ -0,0 +1,23 @@
+# Generated by Django 3.2.13 on 2026-10-18 11:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0061_bibentry_bibtex'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='library',
+            name='json_file',
+            field=models.FileField(blank=True, default='', help_text='Auto-updated CSL-JSON bibliography file.', upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='bibentry',
+            name='csl_json',
+            field=models.JSONField(blank=True, help_text='The entry as CSL-JSON.', null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.13 on 2026-10-18 12:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0062_csl_json_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bibentry',
+            name='item_key',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='Zotero key of the item the entry was exported from.', max_length=20),
+        ),
+    ]
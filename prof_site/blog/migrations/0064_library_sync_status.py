@@ -0,0 +1,38 @@
+# Generated by Django 3.2.13 on 2026-10-18 13:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0063_bibentry_item_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='library',
+            name='sync_state',
+            field=models.CharField(choices=[('Q', 'Queued'), ('R', 'Running'), ('D', 'Done'), ('F', 'Failed')], default='Q', help_text='State of the latest sync with Zotero.', max_length=1),
+        ),
+        migrations.AddField(
+            model_name='library',
+            name='last_synced',
+            field=models.DateTimeField(blank=True, help_text='When the library last synced successfully.', null=True),
+        ),
+        migrations.AddField(
+            model_name='library',
+            name='sync_duration',
+            field=models.DurationField(blank=True, help_text='How long the latest sync took.', null=True),
+        ),
+        migrations.AddField(
+            model_name='library',
+            name='item_count',
+            field=models.IntegerField(blank=True, help_text='Number of entries in the bibliography.', null=True),
+        ),
+        migrations.AddField(
+            model_name='library',
+            name='sync_error',
+            field=models.TextField(blank=True, default='', help_text='Error raised by the latest sync, if any.'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 3.2.13 on 2026-10-18 13:55
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0064_library_sync_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodeCache',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+                ('query', models.CharField(help_text='Normalized address query.', max_length=500, unique=True)),
+                ('location', django.contrib.gis.db.models.fields.PointField(blank=True, help_text='Location returned for the query.', null=True, srid=4326)),
+                ('expires_at', models.DateTimeField(help_text='When the result should be looked up again.')),
+            ],
+            options={
+                'verbose_name': 'Geocode Cache',
+                'verbose_name_plural': 'Geocode Cache',
+            },
+        ),
+        migrations.CreateModel(
+            name='Place',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(help_text='Place name.', max_length=200)),
+                ('admin1', models.CharField(blank=True, default='', help_text='State, province or other first-level division.', max_length=100)),
+                ('admin1_code', models.CharField(blank=True, default='', help_text="Code of the first-level division (e.g., 'MA').", max_length=20)),
+                ('country', models.CharField(blank=True, default='', help_text='Country name.', max_length=100)),
+                ('country_code', models.CharField(blank=True, default='', help_text='ISO country code.', max_length=3)),
+                ('population', models.BigIntegerField(default=0, help_text='Population, used to choose between places sharing a name.')),
+                ('location', django.contrib.gis.db.models.fields.PointField(help_text='Location of the place.', srid=4326)),
+            ],
+            options={
+                'verbose_name': 'Place',
+                'verbose_name_plural': 'Places',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='place',
+            index=models.Index(fields=['name'], name='blog_place_name_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.2.13 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+def build_paths(apps, schema_editor):
+    """
+    Computes the materialized path of every institution, walking down
+    from the roots. Institutions caught in a parent cycle become roots.
+    """
+    Institution = apps.get_model('blog', 'Institution')
+    children = {}
+    for pk, parent_id in Institution.objects.values_list('pk', 'parent_id'):
+        children.setdefault(parent_id, []).append(pk)
+    paths = {}
+    stack = [(pk, '') for pk in children.get(None, [])]
+    while stack:
+        pk, parent_path = stack.pop()
+        paths[pk] = '{}{}/'.format(parent_path, pk)
+        stack.extend((child, paths[pk]) for child in children.get(pk, []) if child not in paths)
+    rows = []
+    for institution in Institution.objects.only('pk'):
+        institution.path = paths.get(institution.pk, '{}/'.format(institution.pk))
+        institution.depth = institution.path.count('/') - 1
+        rows.append(institution)
+    Institution.objects.bulk_update(rows, ['path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0065_geocodecache_place'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='institution',
+            name='path',
+            field=models.CharField(blank=True, default='', editable=False, help_text="Materialized path of primary keys from the root institution down to this one, e.g. '3/12/40/'.", max_length=255),
+        ),
+        migrations.AddField(
+            model_name='institution',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Number of ancestors above this institution.'),
+        ),
+        migrations.AddIndex(
+            model_name='institution',
+            index=models.Index(fields=['path'], name='blog_institution_path_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.13 on 2026-10-18 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0066_institution_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='image_manifest',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='URLs of the generated photo specs, keyed by spec name.'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_manifest',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='URLs of the generated banner specs, keyed by spec name.'),
+        ),
+    ]
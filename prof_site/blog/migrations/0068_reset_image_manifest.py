@@ -0,0 +1,23 @@
+# Generated by Django 3.2.13 on 2026-10-18 15:40
+
+from django.db import migrations
+
+
+def reset_manifests(apps, schema_editor):
+    """
+    Queues every banner and photo for generation again, so the
+    responsive variants are produced for existing images.
+    """
+    for name in ('Post', 'Person'):
+        apps.get_model('blog', name).objects.update(image_manifest={})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0067_image_manifest'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_manifests, migrations.RunPython.noop),
+    ]
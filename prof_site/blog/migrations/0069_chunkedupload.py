@@ -0,0 +1,36 @@
+# Generated by Django 3.2.13 on 2026-10-18 16:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('blog', '0068_reset_image_manifest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChunkedUpload',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, help_text='Identifies the upload to the client.', unique=True)),
+                ('filename', models.CharField(help_text='Name of the file on the client.', max_length=255)),
+                ('size', models.BigIntegerField(help_text='Total size of the file in bytes.')),
+                ('offset', models.BigIntegerField(default=0, help_text='Bytes received so far.')),
+                ('sha256', models.CharField(blank=True, default='', help_text='SHA-256 of the whole file. Checked on completion when the client supplies it.', max_length=64)),
+                ('state', models.CharField(choices=[('U', 'Uploading'), ('C', 'Complete'), ('F', 'Failed')], default='U', help_text='Where is this upload?', max_length=1)),
+                ('user', models.ForeignKey(help_text='Who started the upload?', on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Chunked Upload',
+                'verbose_name_plural': 'Chunked Uploads',
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.2.13 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0069_chunkedupload'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='citationstyle',
+            name='file',
+            field=models.FileField(max_length=255, upload_to='citestyles/'),
+        ),
+        migrations.AlterField(
+            model_name='event',
+            name='banner',
+            field=models.ImageField(blank=True, help_text='Event banner image.', max_length=255, null=True, upload_to='events/banners/%Y/%m/%d'),
+        ),
+        migrations.AlterField(
+            model_name='person',
+            name='photo',
+            field=models.ImageField(blank=True, help_text='Photo/headshot.', max_length=255, null=True, upload_to='authors/images/%Y/%m/%d'),
+        ),
+        migrations.AlterField(
+            model_name='person',
+            name='vita',
+            field=models.FileField(blank=True, default='', help_text='Current curriculum vita.', max_length=255, upload_to='authors/vitae/'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='attach',
+            field=models.FileField(blank=True, default='', help_text='Attachment to this blog post.', max_length=255, upload_to='attachments/'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='banner',
+            field=models.ImageField(help_text='Image to be displayed across the detail. Best if wide.', max_length=255, null=True, upload_to='posts/banners/%Y/%m/%d'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='bib',
+            field=models.FileField(blank=True, help_text='Bibliography file. Formatted in BetterBibLaTex.', max_length=255, upload_to='bibs/'),
+        ),
+    ]
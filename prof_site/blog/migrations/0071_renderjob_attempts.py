@@ -0,0 +1,18 @@
+# Generated by Django 3.2.13 on 2026-10-18 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0070_file_name_length'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='renderjob',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, help_text='How many times has this job been claimed?'),
+        ),
+    ]
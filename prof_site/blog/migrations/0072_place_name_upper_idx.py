@@ -0,0 +1,22 @@
+# Generated by Django 3.2.13 on 2026-10-18 18:25
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0071_renderjob_attempts'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='place',
+            name='blog_place_name_idx',
+        ),
+        migrations.AddIndex(
+            model_name='place',
+            index=models.Index(django.db.models.functions.text.Upper('name'), name='blog_place_name_upper_idx'),
+        ),
+    ]
@@ -1,20 +1,34 @@
 from markdownx.models import MarkdownxField
 from django.contrib.gis.db import models
-from django.db.models import F
+from django.db import connection
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr, Upper
+from django.core.exceptions import ValidationError
 from markdownx.utils import markdownify
-from .pandoc import pandocify
+from .pandoc import bibtex_to_csljson, citekeys
 from autoslug.settings import slugify as default_slugify
 from autoslug import AutoSlugField
-from django.utils.functional import cached_property
 from django.core.serializers import serialize
 from imagekit.models import ImageSpecField
-from imagekit.processors import ResizeToFill, ResizeToCover, Adjust, ColorOverlay, SmartResize
+from imagekit.processors import ResizeToFill, ResizeToCover, SmartResize
+from .processors import GrayOverlay
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
-from .zotero_update import zotero_pull, zotero_version
+from .zotero_update import atomic_write, bib_entries, bib_file_name, bibtex_entries, restore_previous, zotero_changes
 from django.conf import settings
-from .geocode import geocode_address
+from .geocode import geocode
+from . import sitewide
 import os
+import json
+import tempfile
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from django.utils import timezone
+from hashlib import sha256
+
+# Bytes read from a request or file at a time by ChunkedUpload.
+UPLOAD_BLOCK_SIZE = 64 * 1024
 
 class VersionClass(models.Model):
     """
@@ -84,20 +98,205 @@ class Institution(VersionClass):
         null=True,
         blank=True
     )
+    path = models.CharField(
+        help_text = "Materialized path of primary keys from the root institution down to this one, e.g. '3/12/40/'.",
+        max_length=255,
+        blank=True,
+        default='',
+        editable=False
+    )
+    depth = models.PositiveSmallIntegerField(
+        help_text = "Number of ancestors above this institution.",
+        default=0,
+        editable=False
+    )
+    def _parent_path(self):
+        """
+        Returns the stored path of the parent institution.
+        """
+        if not self.parent_id:
+            return ''
+        return Institution.objects.filter(pk=self.parent_id).values_list('path', flat=True).first() or ''
+
+    def clean(self):
+        """
+        Refuses parents that would make the hierarchy cyclic.
+        """
+        if self.pk and str(self.pk) in self._parent_path().split('/'):
+            raise ValidationError({'parent': "An institution cannot be nested under itself."})
+
     def save(self, *args, **kwargs):
         """
-        Overwrite save method to update main bibliography when model is saved.
+        Overwrite save method to geocode the institution and keep the
+        materialized path of it and its descendants up to date.
         """
         if self.location:
             pass
         else:
-            add_array = [self.address, self.city, self.state, self.postal, self.country]
-            query = ','.join(filter(None, add_array))
-            self.location = geocode_address(query)
+            self.location = geocode(self.address, self.city, self.state, self.postal, self.country)
+        parent_path = self._parent_path()
+        old_path = None
+        if self.pk:
+            old_path = Institution.objects.filter(pk=self.pk).values_list('path', flat=True).first()
+            if str(self.pk) in parent_path.split('/'):
+                raise ValueError("An institution cannot be nested under itself.")
         super(Institution, self).save(*args, **kwargs)
+        path = '{}{}/'.format(parent_path, self.pk)
+        depth = path.count('/') - 1
+        if path != old_path:
+            Institution.objects.filter(pk=self.pk).update(path=path, depth=depth)
+            if old_path:
+                # Move: rebase every descendant onto the new path.
+                Institution.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(Value(path), Substr('path', len(old_path) + 1)),
+                    depth=F('depth') + (depth - old_path.count('/') + 1)
+                )
+        self.path, self.depth = path, depth
+
+    def ancestor_ids(self):
+        """
+        Primary keys of the ancestors, nearest first, read from the path.
+        """
+        return [int(pk) for pk in reversed(self.path.split('/')[:-2])]
+
+    def ancestors(self):
+        """
+        Ancestors of the institution, nearest first.
+        """
+        return Institution.objects.filter(pk__in=self.ancestor_ids()).order_by('-depth')
+
+    def descendants(self):
+        """
+        All institutions nested (at any depth) under this one.
+        """
+        return Institution.objects.filter(path__startswith=self.path).exclude(pk=self.pk).order_by('path')
+
+    def breadcrumb(self):
+        """
+        The institution followed by its ancestors, nearest first. Uses
+        the chain loaded by attach_ancestors when there is one.
+        """
+        if not hasattr(self, '_ancestors'):
+            self._ancestors = list(self.ancestors()) if self.parent_id else []
+        return [self] + self._ancestors
+
+    @classmethod
+    def attach_ancestors(cls, institutions):
+        """
+        Loads the parent chains of many institutions in a single
+        recursive query. Each parent is cached on its child, so walking
+        `.parent` or calling breadcrumb() costs no further queries.
+        Institutions whose chain is already attached are skipped.
+        """
+        institutions = [i for i in institutions if i is not None and not hasattr(i, '_ancestors')]
+        ids = list({i.parent_id for i in institutions if i.parent_id})
+        parents = {}
+        if ids:
+            table = connection.ops.quote_name(cls._meta.db_table)
+            parents = {p.pk: p for p in cls.objects.raw(
+                """
+                WITH RECURSIVE chain(id, parent_id) AS (
+                    SELECT id, parent_id FROM {t} WHERE id = ANY(%s)
+                    UNION
+                    SELECT i.id, i.parent_id FROM {t} i JOIN chain c ON i.id = c.parent_id
+                )
+                SELECT * FROM {t} WHERE id IN (SELECT id FROM chain)
+                """.format(t=table),
+                [ids]
+            )}
+        for i in institutions + list(parents.values()):
+            if i.parent_id in parents:
+                cls.parent.field.set_cached_value(i, parents[i.parent_id])
+        for i in institutions:
+            i._ancestors = []
+            parent = parents.get(i.parent_id)
+            while parent is not None and parent not in i._ancestors:
+                i._ancestors.append(parent)
+                parent = parents.get(parent.parent_id)
+        return institutions
+
     class Meta:
         verbose_name = "Institution"
         verbose_name_plural = "Institutions"
+        indexes = [
+            models.Index(fields=['path'], name='blog_institution_path_idx', opclasses=['varchar_pattern_ops']),
+        ]
+
+    def __str__(self):
+        return self.name
+
+class GeocodeCache(VersionClass):
+    """
+    Persistent cache of geocoding results, keyed by normalized query.
+    A null location records a failed lookup.
+    """
+    query = models.CharField(
+        help_text = "Normalized address query.",
+        max_length=500,
+        unique=True
+    )
+    location = models.PointField(
+        help_text = "Location returned for the query.",
+        null=True,
+        blank=True
+    )
+    expires_at = models.DateTimeField(
+        help_text = "When the result should be looked up again."
+    )
+
+    class Meta:
+        verbose_name = "Geocode Cache"
+        verbose_name_plural = "Geocode Cache"
+
+    def __str__(self):
+        return self.query
+
+class Place(VersionClass):
+    """
+    Local gazetteer of populated places, for geocoding city-level
+    addresses without the network. Load with `manage.py load_gazetteer`.
+    """
+    name = models.CharField(
+        help_text = "Place name.",
+        max_length=200
+    )
+    admin1 = models.CharField(
+        help_text = "State, province or other first-level division.",
+        max_length=100,
+        blank=True,
+        default=''
+    )
+    admin1_code = models.CharField(
+        help_text = "Code of the first-level division (e.g., 'MA').",
+        max_length=20,
+        blank=True,
+        default=''
+    )
+    country = models.CharField(
+        help_text = "Country name.",
+        max_length=100,
+        blank=True,
+        default=''
+    )
+    country_code = models.CharField(
+        help_text = "ISO country code.",
+        max_length=3,
+        blank=True,
+        default=''
+    )
+    population = models.BigIntegerField(
+        help_text = "Population, used to choose between places sharing a name.",
+        default=0
+    )
+    location = models.PointField(
+        help_text = "Location of the place."
+    )
+
+    class Meta:
+        verbose_name = "Place"
+        verbose_name_plural = "Places"
+        # gazetteer() matches names with iexact, i.e. UPPER(name).
+        indexes = [models.Index(Upper('name'), name='blog_place_name_upper_idx')]
 
     def __str__(self):
         return self.name
@@ -256,7 +455,8 @@ class Person(VersionClass):
         help_text = "Photo/headshot.",
         null=True, 
         blank=True, 
-        upload_to = 'authors/images/%Y/%m/%d'
+        upload_to = 'authors/images/%Y/%m/%d',
+        max_length=255
     )
     orcid = models.CharField(
         help_text = "Person's ORCID.",
@@ -298,8 +498,7 @@ class Person(VersionClass):
     )
     photo_gray = ImageSpecField(source='photo',
         processors=[
-            Adjust(color=0,contrast=1.5, brightness=1.5),
-            ColorOverlay(color = "#CC003E", overlay_opacity = 0.6 )
+            GrayOverlay(color = "#CC003E", overlay_opacity = 0.6, brightness=1.5, contrast=1.5)
         ],
         format='PNG'
     )
@@ -323,12 +522,30 @@ class Person(VersionClass):
         help_text = "Current curriculum vita.",
         upload_to='authors/vitae/', 
         blank=True, 
-        default=''
+        default='',
+        max_length=255
     )
     page = models.BooleanField(
         help_text = "Does this person have their own detail page?",
         default=False
     )
+    image_manifest = models.JSONField(
+        help_text = "URLs of the generated photo specs, keyed by spec name.",
+        default=dict,
+        blank=True,
+        editable=False
+    )
+
+    def save(self, *args, **kwargs):
+        """
+        Overwrite save method to queue image generation when the photo
+        changes.
+        """
+        old = Person.objects.filter(pk=self.pk).values_list('photo', flat=True).first()
+        if old != self.photo.name:
+            self.image_manifest = {}
+        super(Person, self).save(*args, **kwargs)
+
     @property
     def formatted_markdown(self):
         """
@@ -340,17 +557,23 @@ class Person(VersionClass):
     def current_affiliations(self):
         """
         Lists current affiliations (i.e., those without a specified end date)
-        with primary affiliations first.
+        with primary affiliations first, with their institutions' parent
+        chains loaded.
         """
-        return self.affiliation_set.filter(end = None, show=True, kind='Aff').order_by(F('primary').desc(nulls_last=True),F('start').desc())
+        affiliations = list(self.affiliation_set.select_related('institution').filter(end = None, show=True, kind='Aff').order_by(F('primary').desc(nulls_last=True),F('start').desc()))
+        Institution.attach_ancestors([a.institution for a in affiliations])
+        return affiliations
 
     @property
     def current_appointments(self): 
         """
         Lists current appointments (i.e., those without a specified end date)
-        with primary affiliations first.
+        with primary affiliations first, with their institutions' parent
+        chains loaded.
         """
-        return self.affiliation_set.filter(end = None, show=True, kind='App').order_by(F('primary').desc(nulls_last=True),F('start').desc())
+        appointments = list(self.affiliation_set.select_related('institution').filter(end = None, show=True, kind='App').order_by(F('primary').desc(nulls_last=True),F('start').desc()))
+        Institution.attach_ancestors([a.institution for a in appointments])
+        return appointments
 
     @property
     def primary_affiliation(self):
@@ -367,19 +590,26 @@ class Person(VersionClass):
         affils = list(self.affiliation_set.all().values_list('institution', flat=True))
         return serialize('geojson', Institution.objects.filter(pk__in=affils), geometry_field='location')
 
+    @staticmethod
+    def join_name(first, middle, last):
+        """
+        Joins name parts the way full_name does.
+        """
+        t = ''
+        if first:
+            t = t + first + ' '
+        if middle:
+            t = t + middle + ' '
+        if last:
+            t = t + last
+        return t
+
     @property
     def full_name(self):
         """
         Returns full name.
         """
-        t = ''
-        if self.first:
-            t = t + self.first + ' '
-        if self.middle:
-            t = t + self.middle + ' '
-        if self.last:
-            t = t + self.last
-        return t
+        return Person.join_name(self.first, self.middle, self.last)
 
     class Meta:
         verbose_name = "Person"
@@ -431,26 +661,254 @@ class Library(VersionClass):
         default='',
         blank=True
     )
+    json_file = models.FileField(
+        help_text = "Auto-updated CSL-JSON bibliography file.",
+        default='',
+        blank=True
+    )
+    SYNC_STATES = [
+        ('Q', 'Queued'),
+        ('R', 'Running'),
+        ('D', 'Done'),
+        ('F', 'Failed'),
+    ]
+    sync_state = models.CharField(
+        help_text = "State of the latest sync with Zotero.",
+        max_length=1,
+        choices=SYNC_STATES,
+        default='Q'
+    )
+    last_synced = models.DateTimeField(
+        help_text = "When the library last synced successfully.",
+        null=True,
+        blank=True
+    )
+    sync_duration = models.DurationField(
+        help_text = "How long the latest sync took.",
+        null=True,
+        blank=True
+    )
+    item_count = models.IntegerField(
+        help_text = "Number of entries in the bibliography.",
+        null=True,
+        blank=True
+    )
+    sync_error = models.TextField(
+        help_text = "Error raised by the latest sync, if any.",
+        blank=True,
+        default=''
+    )
     def save(self, *args, **kwargs):
         """
-        Overwrite save method to update main bibliography when model is saved.
+        Overwrite save method to queue a sync of the main bibliography.
+        The sync itself runs in `manage.py process_queue`.
         """
-        library_id = self.zotero_id
-        library_kind = self.kind
-        library_collection = self.collection
-        if self.version:
-            db_version = self.version
-            current_version = zotero_version(library_id, library_kind, library_collection)
-            bib_file = self.bib_file
-            if db_version == current_version and os.path.exists(os.path.join(settings.MEDIA_ROOT, str(bib_file))):
-                pass
-            else: 
-                self.version = current_version
-                zotero_pull(library_id, library_kind, library_collection)
-        else:
-            self.version, self.bib_file = zotero_pull(library_id, library_kind, library_collection)
+        if self.sync_state != 'R' or (self.modified_at and self.modified_at < Library.stale_before()):
+            self.sync_state = 'Q'
         super(Library, self).save(*args, **kwargs)
 
+    @staticmethod
+    def stale_before():
+        """
+        Syncs marked running since before this time belong to a worker
+        that died (e.g. restarted mid-sync) and may be claimed again.
+        """
+        return timezone.now() - timedelta(minutes=settings.SYNC_TIMEOUT)
+
+    def sync(self):
+        """
+        Pulls the items changed since the stored library version into the
+        entry cache and regenerates the bibliography files from it. Falls
+        back to a full download when there is no usable cache.
+        Returns the citekeys that were added, removed or changed.
+        """
+        name = bib_file_name(self.zotero_id, self.collection)
+        full = (
+            not self.version
+            or not os.path.exists(os.path.join(settings.MEDIA_ROOT, name))
+            or self.bibentry_set.filter(item_key='').exists()
+        )
+        version, changes = zotero_changes(
+            self.zotero_id,
+            self.kind,
+            self.collection,
+            0 if full else self.version
+        )
+        if not full and version == self.version:
+            return set()
+        digests = dict(self.bibentry_set.values_list('key', 'digest'))
+        owners = dict(self.bibentry_set.values_list('key', 'item_key'))
+        by_item = {item_key: key for key, item_key in owners.items() if item_key}
+        changed = set()
+        kept = set()
+        for item_key, bibtex in changes:
+            if bibtex is None:
+                if item_key in by_item:
+                    changed.add(by_item[item_key])
+                    self.bibentry_set.filter(item_key=item_key).delete()
+                continue
+            for key, digest, entry in bibtex_entries(bibtex):
+                kept.add(key)
+                if by_item.get(item_key, key) != key:
+                    # The item's citekey changed.
+                    changed.add(by_item[item_key])
+                    self.bibentry_set.filter(key=by_item[item_key]).delete()
+                defaults = {'item_key': item_key}
+                if digests.get(key) != digest:
+                    changed.add(key)
+                    defaults.update(digest=digest, bibtex=entry, csl_json=None)
+                elif owners.get(key) == item_key:
+                    continue
+                BibEntry.objects.update_or_create(
+                    library=self,
+                    key=key,
+                    defaults=defaults
+                )
+        if full:
+            stale = self.bibentry_set.exclude(key__in=kept)
+            changed.update(stale.values_list('key', flat=True))
+            stale.delete()
+        self.version = version
+        self.bib_file = name
+        self.write_bib()
+        self.index_csl_json()
+        Library.objects.filter(pk=self.pk).update(
+            version=self.version,
+            bib_file=self.bib_file,
+            json_file=self.json_file
+        )
+        return changed
+
+    def queue_renders(self, changed):
+        """
+        Queues renders for the posts citing the given citekeys, if this
+        is the site's library.
+        """
+        if changed and SiteWideSetting.objects.filter(library=self).exists():
+            RenderJob.enqueue(Post.objects.filter(
+                    citation__key__in=changed
+                ).distinct().only('id'))
+
+    def write_bib(self):
+        """
+        Regenerates the library's BibTeX file from the entry cache,
+        one entry at a time.
+        """
+        path = os.path.join(settings.MEDIA_ROOT, str(self.bib_file))
+        with atomic_write(path, keep=settings.BIB_HISTORY) as bibtex_file:
+            for bibtex in self.bibentry_set.order_by(
+                    'key'
+                ).values_list('bibtex', flat=True).iterator():
+                bibtex_file.write(bibtex)
+
+    def rollback(self):
+        """
+        Puts the previous BibTeX and CSL-JSON files back in place and
+        reloads the entry cache from them. The next sync is a full one.
+        Returns the citekeys that changed.
+        """
+        bib_path = os.path.join(settings.MEDIA_ROOT, str(self.bib_file))
+        if not restore_previous(bib_path, settings.BIB_HISTORY):
+            return set()
+        items = {}
+        json_path = os.path.join(settings.MEDIA_ROOT, str(self.json_file))
+        if self.json_file and restore_previous(json_path, settings.BIB_HISTORY):
+            with open(json_path) as json_file:
+                items = {item['id']: item for item in json.load(json_file)}
+        entries = bib_entries(bib_path)
+        digests = dict(self.bibentry_set.values_list('key', 'digest'))
+        changed = {k for k in entries.keys() | digests.keys()
+                   if entries.get(k, (None,))[0] != digests.get(k)}
+        self.bibentry_set.filter(key__in=changed).delete()
+        BibEntry.objects.bulk_create([
+            BibEntry(library=self, key=key, digest=digest, bibtex=bibtex, csl_json=items.get(key))
+            for key, (digest, bibtex) in entries.items() if key in changed
+        ])
+        self.version = None
+        Library.objects.filter(pk=self.pk).update(version=None)
+        return changed
+
+    def index_csl_json(self):
+        """
+        Converts entries that lack CSL-JSON (one pandoc run for all of
+        them), then rewrites the library's CSL-JSON file.
+        """
+        stale = list(self.bibentry_set.filter(csl_json__isnull=True).only('id', 'key', 'bibtex'))
+        items = {item['id']: item for item in bibtex_to_csljson(''.join(e.bibtex for e in stale))}
+        for entry in stale:
+            entry.csl_json = items.get(entry.key)
+        BibEntry.objects.bulk_update(
+            [e for e in stale if e.csl_json is not None],
+            ['csl_json'],
+            batch_size=500
+        )
+        name = os.path.splitext(str(self.bib_file))[0] + '.json'
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        with atomic_write(path, keep=settings.BIB_HISTORY) as json_file:
+            json_file.write('[')
+            for i, item in enumerate(self.bibentry_set.filter(
+                    csl_json__isnull=False
+                ).order_by('key').values_list('csl_json', flat=True).iterator()):
+                json_file.write(',\n' if i else '\n')
+                json_file.write(json.dumps(item))
+            json_file.write('\n]\n')
+        self.json_file = name
+
+    def missing_keys(self, keys):
+        """
+        Citekeys not in this library, checked without running pandoc.
+        """
+        return set(keys) - set(self.bibentry_set.filter(key__in=keys).values_list('key', flat=True))
+
+    @contextmanager
+    def pruned_bib(self, keys):
+        """
+        Writes a bibliography holding only the entries for the given
+        citekeys, so citeproc never parses the whole library, and yields
+        its path (None when nothing is cited). The file is CSL-JSON when
+        every entry has been indexed (see index_csl_json) and BibTeX
+        otherwise, and is removed on exit.
+        """
+        if not keys:
+            yield None
+            return
+        entries = list(self.bibentry_set.filter(
+                key__in=keys
+            ).order_by('key').values_list('csl_json', 'bibtex'))
+        as_json = all(item is not None for item, _ in entries)
+        fd, path = tempfile.mkstemp(prefix='pruned', suffix='.json' if as_json else '.bib')
+        try:
+            with os.fdopen(fd, 'w') as bib_file:
+                if as_json:
+                    json.dump([item for item, _ in entries], bib_file)
+                else:
+                    bib_file.write(''.join(bibtex for _, bibtex in entries))
+            yield path
+        finally:
+            os.remove(path)
+
+    def entry_digests(self, keys):
+        """
+        Maps citekeys to their entry digests in a single query.
+        """
+        return dict(self.bibentry_set.filter(key__in=keys).values_list('key', 'digest'))
+
+    def entry_digest(self, keys, digests=None):
+        """
+        Combined digest of the entries for the given citekeys.
+        Empty when nothing is cited, so uncited posts never depend on
+        the bibliography. Pass `digests` (see entry_digests) to avoid
+        a query per call.
+        """
+        if not keys:
+            return ''
+        if digests is None:
+            digests = self.entry_digests(keys)
+        h = sha256()
+        for key in sorted(keys):
+            h.update((key + ':' + digests.get(key, '') + '\0').encode('utf-8'))
+        return h.hexdigest()
+
     class Meta:
         verbose_name = "Zotero Library"
         verbose_name_plural = "Zotero Libraries"
@@ -458,6 +916,50 @@ class Library(VersionClass):
     def __str__(self):
         return self.name
 
+class BibEntry(VersionClass):
+    """
+    One entry of a Zotero library's bibliography, tracked by digest
+    so changes can be traced to the posts that cite it.
+    """
+    library = models.ForeignKey(
+        Library,
+        help_text = "Library the entry belongs to.",
+        on_delete=models.CASCADE
+    )
+    item_key = models.CharField(
+        help_text = "Zotero key of the item the entry was exported from.",
+        max_length=20,
+        blank=True,
+        default='',
+        db_index=True
+    )
+    key = models.CharField(
+        help_text = "BibTeX citekey.",
+        max_length=250
+    )
+    digest = models.CharField(
+        help_text = "Hash of the entry's fields.",
+        max_length=64
+    )
+    bibtex = models.TextField(
+        help_text = "The entry as BibTeX.",
+        blank=True,
+        default=''
+    )
+    csl_json = models.JSONField(
+        help_text = "The entry as CSL-JSON.",
+        null=True,
+        blank=True
+    )
+
+    class Meta:
+        verbose_name = "Bibliography Entry"
+        verbose_name_plural = "Bibliography Entries"
+        unique_together = ['library', 'key']
+
+    def __str__(self):
+        return self.key
+
 class SiteWideSetting(VersionClass):
     """
     This model describes site-wide settings.
@@ -484,6 +986,38 @@ class SiteWideSetting(VersionClass):
         on_delete = models.SET_NULL
     )
 
+    @classmethod
+    def render_args(cls):
+        """
+        Returns the CSL path, bibliography path and library
+        posts should be rendered with.
+        """
+        csl = None
+        biblio = None
+        library = None
+        setting = sitewide.setting()
+        if setting:
+            if setting.csl and setting.csl.file:
+                csl = settings.BASE_DIR + setting.csl.file.url
+            if setting.library and setting.library.bib_file:
+                biblio = settings.BASE_DIR + setting.library.bib_file.url
+                library = setting.library
+        return csl, biblio, library
+
+    def save(self, *args, **kwargs):
+        """
+        Overwrite save method to re-render citing posts when the CSL or
+        bibliography changes.
+        """
+        try:
+            old = SiteWideSetting.objects.get(pk=self.pk)
+            changed = old.csl_id != self.csl_id or old.library_id != self.library_id
+        except SiteWideSetting.DoesNotExist:
+            changed = True
+        super(SiteWideSetting, self).save(*args, **kwargs)
+        if changed:
+            RenderJob.enqueue_citing()
+
     class Meta:
         verbose_name = "SiteWideSetting"
         verbose_name_plural = "SiteWideSettings"
@@ -767,7 +1301,8 @@ class Post(VersionClass):
     banner = models.ImageField(
         help_text = "Image to be displayed across the detail. Best if wide.",
         null=True, 
-        upload_to = 'posts/banners/%Y/%m/%d'
+        upload_to = 'posts/banners/%Y/%m/%d',
+        max_length=255
     )
     banner_thumb = ImageSpecField(
         source='banner',
@@ -801,13 +1336,15 @@ class Post(VersionClass):
     bib = models.FileField(
         help_text = "Bibliography file. Formatted in BetterBibLaTex.",
         upload_to='bibs/', 
-        blank=True
+        blank=True,
+        max_length=255
     )
     attach = models.FileField(
         help_text = "Attachment to this blog post.",
         upload_to='attachments/', 
         blank=True, 
-        default=''
+        default='',
+        max_length=255
     )
     attach_kind = models.CharField(
         help_text = "What kind of thing is the attachment? E.g., syllabus, article).",
@@ -816,6 +1353,30 @@ class Post(VersionClass):
         default='',
         null=True
     )
+    html = models.TextField(
+        help_text = "Rendered post content (updated by the render queue).",
+        blank=True,
+        default='',
+        editable=False
+    )
+    excerpt = models.TextField(
+        help_text = "Plain-text excerpt of the rendered content.",
+        blank=True,
+        default='',
+        editable=False
+    )
+    rendered_at = models.DateTimeField(
+        help_text = "When the post content was last rendered.",
+        null=True,
+        blank=True,
+        editable=False
+    )
+    image_manifest = models.JSONField(
+        help_text = "URLs of the generated banner specs, keyed by spec name.",
+        default=dict,
+        blank=True,
+        editable=False
+    )
     slug = AutoSlugField(
         populate_from='title', 
         default=None,
@@ -844,24 +1405,22 @@ class Post(VersionClass):
         """
         return self.display_datetime.time()
 
-    @cached_property
-    def pandoc_process(self):
+    def save(self, *args, **kwargs):
         """
-        Process the post content using pandoc and the sitewide CSL.
+        Overwrite save method to queue a render when the content changes,
+        and image generation when the banner does.
         """
-        try:
-            csl = SiteWideSetting.objects.all().order_by('-id')[0].csl.file.url
-        except:
-            csl = None
-        try:
-            biblio=SiteWideSetting.objects.all().order_by('-id')[0].library.bib_file.url
-        except:
-            biblio=None
-        return pandocify(
-            content=self.content,
-            csl=settings.BASE_DIR+csl,
-            bib=settings.BASE_DIR+biblio
-        )
+        old, old_banner = Post.objects.filter(pk=self.pk).values_list('content', 'banner').first() or (None, None)
+        if old_banner != self.banner.name:
+            self.image_manifest = {}
+        super(Post, self).save(*args, **kwargs)
+        if old != self.content:
+            self.citation_set.all().delete()
+            Citation.objects.bulk_create(
+                [Citation(post=self, key=k) for k in citekeys(self.content)]
+            )
+        if old != self.content or not self.html:
+            RenderJob.enqueue([self])
 
     class Meta:
         verbose_name = "Post"
@@ -870,13 +1429,260 @@ class Post(VersionClass):
     def __str__(self):
         return self.title
 
+class Citation(models.Model):
+    """
+    Indexes the citekeys each post cites.
+    """
+    post = models.ForeignKey(
+        Post,
+        help_text = "Citing post.",
+        on_delete=models.CASCADE
+    )
+    key = models.CharField(
+        help_text = "Cited BibTeX citekey.",
+        max_length=250,
+        db_index=True
+    )
+
+    class Meta:
+        verbose_name = "Citation"
+        verbose_name_plural = "Citations"
+        unique_together = ['post', 'key']
+
+    def __str__(self):
+        return self.key
+
+class RenderJob(VersionClass):
+    """
+    Database-backed queue of posts waiting to be rendered.
+    Worked off by `manage.py process_queue`.
+    """
+    post = models.ForeignKey(
+        Post,
+        help_text = "Post to render.",
+        on_delete=models.CASCADE
+    )
+    STATES = [
+        ('P', 'Pending'),
+        ('R', 'Running'),
+        ('D', 'Done'),
+        ('F', 'Failed'),
+    ]
+    state = models.CharField(
+        help_text = "Where is this job in the queue?",
+        max_length=1,
+        choices=STATES,
+        default='P'
+    )
+    error = models.TextField(
+        help_text = "Error raised by the last attempt, if any.",
+        blank=True,
+        default=''
+    )
+    attempts = models.PositiveSmallIntegerField(
+        help_text = "How many times has this job been claimed?",
+        default=0
+    )
+
+    @staticmethod
+    def stale_before():
+        """
+        Jobs marked running since before this time belong to a worker
+        that died (e.g. restarted mid-render) and may be claimed again.
+        """
+        return timezone.now() - timedelta(minutes=settings.RENDER_TIMEOUT)
+
+    @classmethod
+    def enqueue(cls, posts):
+        """
+        Queue posts for rendering, skipping any that are already pending.
+        """
+        ids = {p.pk for p in posts}
+        ids -= set(cls.objects.filter(
+                state='P',
+                post__in=ids
+            ).values_list('post_id', flat=True))
+        cls.objects.bulk_create([cls(post_id=i) for i in ids])
+
+    @classmethod
+    def enqueue_citing(cls):
+        """
+        Queue every post that cites anything, e.g. after the CSL changes.
+        """
+        cls.enqueue(Post.objects.filter(citation__isnull=False).distinct().only('id'))
+
+    class Meta:
+        verbose_name = "Render Job"
+        verbose_name_plural = "Render Jobs"
+
+    def __str__(self):
+        return str(self.post_id) + ' ' + self.get_state_display()
+
+class RenderCache(VersionClass):
+    """
+    Persistent store of pandoc output, keyed by a hash of everything
+    that affects the render (see pandoc.render_key).
+    """
+    key = models.CharField(
+        help_text = "Hash of content, CSL, cited bibliography entries and pandoc version.",
+        max_length=64,
+        unique=True
+    )
+    html = models.TextField(
+        help_text = "Rendered HTML."
+    )
+
+    class Meta:
+        verbose_name = "Render Cache"
+        verbose_name_plural = "Render Cache"
+
+    def __str__(self):
+        return self.key
+
+class ChunkedUpload(VersionClass):
+    """
+    A large file arriving in chunks from the admin. Chunks are appended
+    to a partial file on disk, so an interrupted upload resumes from
+    `offset` instead of starting over.
+    """
+    token = models.UUIDField(
+        help_text = "Identifies the upload to the client.",
+        default=uuid.uuid4,
+        unique=True,
+        editable=False
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        help_text = "Who started the upload?",
+        on_delete=models.CASCADE
+    )
+    filename = models.CharField(
+        help_text = "Name of the file on the client.",
+        max_length=255
+    )
+    size = models.BigIntegerField(
+        help_text = "Total size of the file in bytes."
+    )
+    offset = models.BigIntegerField(
+        help_text = "Bytes received so far.",
+        default=0
+    )
+    sha256 = models.CharField(
+        help_text = "SHA-256 of the whole file. Checked on completion when the client supplies it.",
+        max_length=64,
+        blank=True,
+        default=''
+    )
+    STATES = [
+        ('U', 'Uploading'),
+        ('C', 'Complete'),
+        ('F', 'Failed'),
+    ]
+    state = models.CharField(
+        help_text = "Where is this upload?",
+        max_length=1,
+        choices=STATES,
+        default='U'
+    )
+
+    class Meta:
+        verbose_name = "Chunked Upload"
+        verbose_name_plural = "Chunked Uploads"
+
+    def __str__(self):
+        return self.filename + ' ' + self.get_state_display()
+
+    @property
+    def part_path(self):
+        """Where the received bytes are kept until the upload is used."""
+        return os.path.join(settings.MEDIA_ROOT, 'uploads', 'partial', str(self.token) + '.part')
+
+    def status(self):
+        """What the upload views report to the client."""
+        return {
+            'token': str(self.token),
+            'filename': self.filename,
+            'size': self.size,
+            'offset': self.offset,
+            'state': self.state,
+            'sha256': self.sha256,
+        }
+
+    def start(self):
+        """Creates the empty partial file chunks are appended to."""
+        os.makedirs(os.path.dirname(self.part_path), exist_ok=True)
+        open(self.part_path, 'wb').close()
+
+    def write_chunk(self, stream, length, checksum=None):
+        """
+        Appends `length` bytes read from `stream` at the current offset,
+        a block at a time so memory stays bounded whatever the chunk
+        size. A short read or a `checksum` mismatch leaves the file and
+        offset as they were and raises ValueError.
+        """
+        digest = sha256()
+        received = 0
+        with open(self.part_path, 'r+b') as part:
+            # Drop whatever a previously interrupted chunk left behind.
+            part.truncate(self.offset)
+            part.seek(self.offset)
+            while received < length:
+                block = stream.read(min(UPLOAD_BLOCK_SIZE, length - received))
+                if not block:
+                    break
+                part.write(block)
+                digest.update(block)
+                received += len(block)
+            if received != length:
+                part.truncate(self.offset)
+                raise ValueError("Chunk ended after %d of %d bytes." % (received, length))
+            if checksum and digest.hexdigest() != checksum.lower():
+                part.truncate(self.offset)
+                raise ValueError("Chunk checksum mismatch.")
+        self.offset += length
+        if self.offset == self.size:
+            self.finish()
+
+    def finish(self):
+        """
+        Hashes the assembled file and checks it against the declared
+        checksum. A mismatch marks the upload failed and removes it.
+        """
+        digest = sha256()
+        with open(self.part_path, 'rb') as part:
+            for block in iter(lambda: part.read(UPLOAD_BLOCK_SIZE), b''):
+                digest.update(block)
+        if self.sha256 and digest.hexdigest() != self.sha256.lower():
+            self.state = 'F'
+            self.discard()
+            return
+        self.sha256 = digest.hexdigest()
+        self.state = 'C'
+
+    def discard(self):
+        """Removes the partial file, if there still is one."""
+        try:
+            os.remove(self.part_path)
+        except FileNotFoundError:
+            pass
+
+    @classmethod
+    def expire(cls):
+        """Removes uploads, and their partial files, older than UPLOAD_EXPIRY."""
+        cutoff = timezone.now() - timedelta(days=settings.UPLOAD_EXPIRY)
+        stale = cls.objects.filter(modified_at__lt=cutoff)
+        for upload in stale:
+            upload.discard()
+        stale.delete()
+
 class CitationStyle(VersionClass):
     name = models.CharField(
         max_length=50, 
         unique=True
     )
     file = models.FileField(
-        upload_to='citestyles/'
+        upload_to='citestyles/',
+        max_length=255
     )
 
     class Meta:
@@ -962,9 +1768,7 @@ class ConferenceInstance(VersionClass):
         if self.location:
             pass
         else:
-            add_array = [self.address, self.city, self.state, self.postal, self.country]
-            query = ','.join(filter(None, add_array))
-            self.location = geocode_address(query)
+            self.location = geocode(self.address, self.city, self.state, self.postal, self.country)
         super(ConferenceInstance, self).save(*args, **kwargs)
 
     class Meta:
@@ -980,7 +1784,8 @@ class Event(VersionClass):
         help_text = "Event banner image.",
         null=True, 
         blank=True, 
-        upload_to = 'events/banners/%Y/%m/%d'
+        upload_to = 'events/banners/%Y/%m/%d',
+        max_length=255
     )
     day = models.DateField(
         help_text = "On what day does the event take place?"
@@ -1,6 +1,20 @@
 import pypandoc
 from django.conf import settings
-from re import search
+from re import DOTALL, MULTILINE, search, compile
+from functools import lru_cache
+from hashlib import sha256
+import json
+import os
+
+cite_reg = "( |\\[)-?@"
+citekey_reg = compile(r'(?<![\w@.])-?@(?:\{([^}]+)\}|(\w(?:[\w:.#$%&+?<>~/-]*\w)?))')
+# Fenced code blocks (to their closing fence, or the end) and inline
+# code spans, which pandoc never reads citations from.
+code_reg = compile(
+    r'^(`{3,}|~{3,}).*?(?:^\1[`~]*[ \t]*$|\Z)'
+    r'|(?<!`)(`+)(?!`)(?:(?!\n[ \t]*\n).)+?(?<!`)\2(?!`)',
+    MULTILINE | DOTALL
+)
 
 yaml = """
 ---
@@ -9,23 +23,160 @@ top-level-division: section
 ...
 """
 
-def pandocify(content, csl, bib):
+@lru_cache(maxsize=1)
+def pandoc_version():
+    """
+    Version of the pandoc binary pypandoc shells out to.
+    """
+    return pypandoc.get_pandoc_version()
+
+@lru_cache(maxsize=32)
+def _file_digest(path, mtime):
+    h = sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def file_digest(path):
+    """
+    Hash of a file's contents, memoized on its modification time
+    so repeated lookups don't re-read unchanged files.
+    """
+    if not path or not os.path.exists(path):
+        return ''
+    return _file_digest(path, os.path.getmtime(path))
+
+def citekeys(content):
+    """
+    Citation keys referenced by Pandoc citations in markdown content.
+    """
+    return {a or b for a, b in citekey_reg.findall(code_reg.sub(' ', content))}
+
+def render_key(content, csl, bib_digest):
+    """
+    Content-addressed key for a render: changes whenever the content,
+    the CSL file, the cited bibliography entries or pandoc itself changes.
+    """
+    h = sha256()
+    for part in (content, file_digest(csl), str(bib_digest), pandoc_version()):
+        h.update(part.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+def bibtex_to_csljson(bibtex):
+    """
+    Converts BibTeX to a list of CSL-JSON items in one pandoc run.
+    Each item's `id` is its citekey.
+    """
+    if not bibtex.strip():
+        return []
+    return json.loads(pypandoc.convert_text(bibtex, 'csljson', format='bibtex'))
+
+def _extra_args(csl, bib):
     if bib and csl:
-        filters = []
-        extra_args = ['--mathjax',
+        return ['--mathjax',
                 '--citeproc',
                 '--bibliography='+bib,
                 '--csl='+csl]
-        cite_reg = "( |\[)-?@"
-        if search(cite_reg, content):
-            content = content + "\n\n### References"
-    else:
-        filters = []
-        extra_args = ['--mathjax']
+    return ['--mathjax']
+
+def pandocify(content, csl, bib):
+    if bib and csl and search(cite_reg, content):
+        content = content + "\n\n### References"
     return pypandoc.convert_text(
         yaml + content,
         'html5',
         format = 'md',
-        extra_args = extra_args,
-        filters = filters
+        extra_args = _extra_args(csl, bib),
+        filters = []
     )
+
+
+boundary = '<!-- pandocify:{} -->'
+boundary_reg = compile(r'<!-- pandocify:(\d+) -->\n?')
+# Footnotes of both syntaxes ([^id] and ^[inline]) are numbered
+# document-wide.
+footnote_reg = compile(r'\[\^[^\]]+\]|\^\[')
+# ATX and setext headings; pandoc deduplicates their ids document-wide.
+heading_reg = compile(r'^(?:#{1,6}(?:\s|$)|[=-]+[ \t]*$)', MULTILINE)
+
+def _batchable(content):
+    """
+    Posts can share a pandoc process only when nothing in them is
+    numbered or disambiguated across the whole document: citations
+    (year suffixes, note styles, numbering), footnotes and heading ids.
+    Cited posts therefore always render alone; citeproc's output can't
+    be split back into what each post would have rendered to.
+    """
+    if search(cite_reg, content) or citekeys(content):
+        return False
+    if footnote_reg.search(content) or heading_reg.search(content):
+        return False
+    return True
+
+def _split_batch(html, batch):
+    """
+    Split a batched render on its boundary comments. Returns a mapping
+    of document index -> html for the documents that came back intact.
+    A document whose boundary is missing (swallowed by, say, an
+    unclosed code fence in the one before it) is left out, and so is
+    the document before it, whose piece holds the swallowed text.
+    """
+    pieces = boundary_reg.split(html)
+    found = {}
+    for i, body in zip(pieces[1::2], pieces[2::2]):
+        i = int(i)
+        if i in batch and i not in found:
+            found[i] = body.strip('\n') + '\n'
+    for n, i in enumerate(batch):
+        if i not in found and n:
+            found.pop(batch[n - 1], None)
+    return found
+
+def _pandocify_alone(content, csl, bib):
+    try:
+        return pandocify(content, csl, bib)
+    except RuntimeError as e:
+        return e
+
+def pandocify_batch(contents, csl, bib):
+    """
+    Render many documents with a single pandoc process.
+    Documents are joined with raw-HTML boundary comments and split
+    again afterwards. Documents that can't be batched (see _batchable),
+    or whose piece doesn't come back intact, are rendered one at a time,
+    so every result matches what the document renders to alone.
+    A document pandoc fails on gets its RuntimeError in place of html,
+    so it fails alone.
+    """
+    results = [None] * len(contents)
+    batch = []
+    for i, content in enumerate(contents):
+        if _batchable(content):
+            batch.append(i)
+        else:
+            results[i] = _pandocify_alone(content, csl, bib)
+    if len(batch) < 2:
+        for i in batch:
+            results[i] = _pandocify_alone(contents[i], csl, bib)
+        return results
+    parts = []
+    for i in batch:
+        parts.append('```{=html}\n' + boundary.format(i) + '\n```')
+        parts.append(contents[i])
+    try:
+        html = pypandoc.convert_text(
+            yaml + '\n\n'.join(parts),
+            'html5',
+            format = 'md',
+            extra_args = _extra_args(csl, bib),
+            filters = []
+        )
+    except RuntimeError:
+        # One bad document shouldn't sink the rest.
+        html = ''
+    found = _split_batch(html, batch)
+    for i in batch:
+        results[i] = found[i] if i in found else _pandocify_alone(contents[i], csl, bib)
+    return results
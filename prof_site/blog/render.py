@@ -0,0 +1,141 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+from .models import Post, RenderCache, RenderJob, SiteWideSetting
+from .pandoc import citekeys, pandocify_batch, render_key
+
+def make_excerpt(html, words=50):
+    """
+    Plain-text excerpt of rendered HTML.
+    """
+    return Truncator(strip_tags(html)).words(words)
+
+def store(post_id, html):
+    """
+    Write a render to a post's precomputed columns.
+    Uses update() so saving doesn't queue another render.
+    """
+    Post.objects.filter(pk=post_id).update(
+        html=html,
+        excerpt=make_excerpt(html),
+        rendered_at=timezone.now()
+    )
+
+def render_keys(posts, csl, library):
+    """
+    Render cache keys for many posts, looking up cited entries in one query.
+    """
+    cited = {p.pk: citekeys(p.content) for p in posts}
+    if library:
+        digests = library.entry_digests(set().union(*cited.values()))
+    return {
+        p.pk: render_key(
+            p.content,
+            csl,
+            library.entry_digest(cited[p.pk], digests) if library else None
+        )
+        for p in posts
+    }
+
+def render_group(posts, csl, library):
+    """
+    Render one group of posts in a pandoc process. Returns a list of
+    html or, for posts that failed, the exception.
+    """
+    try:
+        keys = set().union(*(citekeys(p.content) for p in posts))
+        with library.pruned_bib(keys) if library else nullcontext() as bib:
+            return pandocify_batch([p.content for p in posts], csl, bib)
+    except Exception as e:
+        return [e] * len(posts)
+
+def render_posts(posts, processes=1):
+    """
+    Render many posts, returning mappings of post id -> html and of
+    post id -> exception for those that failed. Cached renders are
+    reused; the rest are split across at most `processes` pandoc
+    invocations running side by side.
+    """
+    csl, _, library = SiteWideSetting.render_args()
+    keys = render_keys(posts, csl, library)
+    html = {}
+    errors = {}
+    cached = dict(RenderCache.objects.filter(
+            key__in=keys.values()
+        ).values_list('key', 'html'))
+    misses = []
+    for p in posts:
+        if keys[p.pk] in cached:
+            html[p.pk] = cached[keys[p.pk]]
+        else:
+            misses.append(p)
+    groups = [misses[i::processes] for i in range(processes) if misses[i::processes]]
+    if groups:
+        with ThreadPoolExecutor(max_workers=len(groups)) as pool:
+            rendered = pool.map(lambda g: render_group(g, csl, library), groups)
+            for group, results in zip(groups, rendered):
+                for p, result in zip(group, results):
+                    if isinstance(result, Exception):
+                        errors[p.pk] = result
+                    else:
+                        html[p.pk] = result
+        RenderCache.objects.bulk_create(
+            [RenderCache(key=keys[p.pk], html=html[p.pk]) for p in misses if p.pk in html],
+            ignore_conflicts=True
+        )
+    return html, errors
+
+def claim(limit):
+    """
+    Mark up to `limit` jobs as running and return them. Rows locked by
+    other workers are skipped. Failed jobs, and jobs left running by a
+    worker that died, are claimed again until they have been attempted
+    RENDER_ATTEMPTS times.
+    """
+    stale = RenderJob.stale_before()
+    retry = Q(state='F') | Q(state='R', modified_at__lt=stale)
+    with transaction.atomic():
+        RenderJob.objects.filter(
+                state='R',
+                modified_at__lt=stale,
+                attempts__gte=settings.RENDER_ATTEMPTS
+            ).update(state='F', error='Worker died mid-render.')
+        jobs = list(RenderJob.objects.select_for_update(
+                skip_locked=True
+            ).filter(
+                Q(state='P') | retry & Q(attempts__lt=settings.RENDER_ATTEMPTS)
+            ).order_by('created_at')[:limit])
+        RenderJob.objects.filter(pk__in=[j.pk for j in jobs]).update(
+            state='R',
+            modified_at=timezone.now(),
+            attempts=F('attempts') + 1
+        )
+    return jobs
+
+def work(workers, batch=None):
+    """
+    Claim pending jobs and render them with at most `workers` pandoc
+    processes. A post that fails only fails its own job. Returns the
+    number of jobs processed.
+    """
+    jobs = claim(batch or workers * 25)
+    if not jobs:
+        return 0
+    ids = [j.pk for j in jobs]
+    try:
+        posts = list(Post.objects.filter(pk__in=[j.post_id for j in jobs]))
+        html, errors = render_posts(posts, workers)
+    except Exception as e:
+        RenderJob.objects.filter(pk__in=ids).update(state='F', error=repr(e))
+        return len(jobs)
+    for pk, result in html.items():
+        store(pk, result)
+    for pk, e in errors.items():
+        RenderJob.objects.filter(pk__in=ids, post_id=pk).update(state='F', error=repr(e))
+    RenderJob.objects.filter(pk__in=ids).exclude(post_id__in=errors).update(state='D', error='')
+    return len(jobs)
@@ -1,17 +1,39 @@
 from rest_framework import serializers
+from django.db import models
 from .models import Education, Institution, Committee_Membership, Person, Affiliation, Award
 
 class InstitutionSerializer(serializers.ModelSerializer):
     class Meta:
         depth = 6
         model = Institution
-        exclude = ['id', 'created_at', 'modified_at', 'location']
+        exclude = ['id', 'created_at', 'modified_at', 'location', 'path', 'depth']
 
 # Required to apply InstitutionSerializer to self-
 # referential parent field. (Can't assign class
 # before definition.)
 InstitutionSerializer._declared_fields['parent'] = InstitutionSerializer()
 
+class InstitutionChainListSerializer(serializers.ListSerializer):
+    """
+    Loads the parent chain of every nested institution (the fields
+    named in the child's Meta.institution_fields) in one query
+    before serializing, rather than one query per level per row.
+    Many-to-many fields should be prefetched so the serialized
+    instances are the ones carrying the cached parents.
+    """
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.Manager) else data)
+        institutions = []
+        for item in items:
+            for name in self.child.Meta.institution_fields:
+                value = getattr(item, name)
+                if isinstance(value, models.Manager):
+                    institutions.extend(value.all())
+                else:
+                    institutions.append(value)
+        Institution.attach_ancestors(institutions)
+        return super(InstitutionChainListSerializer, self).to_representation(items)
+
 class AffiliationSerializer(serializers.ModelSerializer):
     start = serializers.DateField(format='%Y')
     end = serializers.DateField(format='%Y')
@@ -19,6 +41,8 @@ class AffiliationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Affiliation
         exclude = ['id', 'primary', 'kind', 'show', 'person', 'created_at', 'modified_at']
+        list_serializer_class = InstitutionChainListSerializer
+        institution_fields = ['institution']
 
 class MainPersonSerializer(serializers.ModelSerializer):
     full_name = serializers.CharField()
@@ -27,7 +51,7 @@ class MainPersonSerializer(serializers.ModelSerializer):
     class Meta:
         depth = 6
         model = Person
-        exclude = ['id', 'page', 'affil', 'first', 'middle', 'last', 'created_at', 'modified_at']
+        exclude = ['id', 'page', 'affil', 'first', 'middle', 'last', 'created_at', 'modified_at', 'image_manifest']
 
 class CommitteeSerializer(serializers.ModelSerializer):
     chair = serializers.ReadOnlyField()
@@ -48,6 +72,8 @@ class EducationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Education
         exclude = ['terminal', 'show', 'id', 'created_at', 'modified_at']
+        list_serializer_class = InstitutionChainListSerializer
+        institution_fields = ['institution']
 
 class AwardSerializer(serializers.ModelSerializer):
     grantor = InstitutionSerializer()
@@ -56,4 +82,6 @@ class AwardSerializer(serializers.ModelSerializer):
     end = serializers.DateField(format='%Y')
     class Meta:
         model = Award
-        exclude = ['id', 'show', 'kind', 'created_at', 'modified_at']
\ No newline at end of file
+        exclude = ['id', 'show', 'kind', 'created_at', 'modified_at']
+        list_serializer_class = InstitutionChainListSerializer
+        institution_fields = ['grantor', 'grantees']
\ No newline at end of file
@@ -0,0 +1,81 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Substr
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from .models import Award, CitationStyle, Institution, Library, Person, RenderJob, SiteWideSetting
+from . import sitewide, vita
+
+@receiver(pre_delete, sender=Institution)
+def detach_descendants(sender, instance, **kwargs):
+    """
+    Children of a deleted institution become roots (parent is SET_NULL),
+    so strip the deleted institution's path from every descendant. The
+    path is re-read because a bulk delete may already have rebased it.
+    """
+    path = Institution.objects.filter(pk=instance.pk).values_list('path', flat=True).first()
+    if not path:
+        return
+    Institution.objects.filter(path__startswith=path).exclude(pk=instance.pk).update(
+        path=Substr('path', len(path) + 1),
+        depth=F('depth') - path.count('/')
+    )
+
+def rebuild_vita():
+    """
+    Rebuilds the vita document; skipped until a main person is set.
+    """
+    try:
+        vita.rebuild()
+    except IndexError:
+        pass
+
+def schedule_rebuild():
+    """
+    Rebuilds the vita once the transaction commits, scheduling it at
+    most once however many vita rows the transaction changes (e.g. an
+    admin form and its inlines).
+    """
+    connection = transaction.get_connection()
+    if connection.in_atomic_block and any(entry[1] is rebuild_vita for entry in connection.run_on_commit):
+        return
+    transaction.on_commit(rebuild_vita)
+
+def vita_saved(sender, **kwargs):
+    vita.invalidate()
+    schedule_rebuild()
+
+def vita_deleted(sender, **kwargs):
+    vita.invalidate(untracked=True)
+    schedule_rebuild()
+
+def vita_m2m_changed(sender, action, **kwargs):
+    if action.startswith('post_'):
+        vita.invalidate(untracked=True)
+        schedule_rebuild()
+
+for model in vita.VITA_MODELS:
+    post_save.connect(vita_saved, sender=model, dispatch_uid='vita_saved_' + model.__name__)
+    post_delete.connect(vita_deleted, sender=model, dispatch_uid='vita_deleted_' + model.__name__)
+m2m_changed.connect(vita_m2m_changed, sender=Award.grantees.through, dispatch_uid='vita_m2m_grantees')
+
+def sitewide_changed(sender, **kwargs):
+    """
+    Bumps the version now, so this transaction sees its own change, and
+    again after commit, in case another process reloaded in between.
+    """
+    sitewide.invalidate()
+    transaction.on_commit(sitewide.invalidate)
+
+for model in (SiteWideSetting, CitationStyle, Library, Person):
+    post_save.connect(sitewide_changed, sender=model, dispatch_uid='sitewide_saved_' + model.__name__)
+    post_delete.connect(sitewide_changed, sender=model, dispatch_uid='sitewide_deleted_' + model.__name__)
+
+@receiver(post_save, sender=CitationStyle)
+def csl_saved(sender, instance, **kwargs):
+    """
+    Re-renders citing posts when the site's citation style is edited,
+    e.g. its file replaced. Unchanged files hit the render cache.
+    """
+    if SiteWideSetting.objects.filter(csl=instance).exists():
+        RenderJob.enqueue_citing()
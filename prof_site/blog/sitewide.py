@@ -0,0 +1,47 @@
+import threading
+from uuid import uuid4
+from django.core.cache import cache
+
+VERSION_KEY = 'blog:sitewide:version'
+
+_lock = threading.Lock()
+_local = {'version': None, 'setting': None}
+
+def current_version():
+    """
+    Returns the shared version stamp, creating it if it is missing.
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+def setting():
+    """
+    Returns the site-wide setting (with its CSL, library and main
+    person loaded), or None. It is kept in process memory and only
+    reloaded when another process bumps the shared version.
+    """
+    from .models import SiteWideSetting
+    version = current_version()
+    with _lock:
+        if _local['version'] != version or version is None:
+            _local['setting'] = SiteWideSetting.objects.select_related(
+                    'csl', 'library', 'main_person'
+                ).order_by('-id').first()
+            _local['version'] = version
+        return _local['setting']
+
+def main_person():
+    """
+    Returns the site's main person, or None.
+    """
+    s = setting()
+    return s.main_person if s else None
+
+def invalidate():
+    """
+    Bumps the shared version so every process reloads the setting.
+    """
+    cache.set(VERSION_KEY, uuid4().hex, None)
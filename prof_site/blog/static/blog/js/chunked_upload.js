@@ -0,0 +1,147 @@
+// Resumable chunked uploads for the admin's large file fields.
+//
+// A chosen file is sent in UPLOAD_CHUNK_SIZE slices, each with its
+// SHA-256, to blog:upload_start / blog:upload_detail. Only the upload
+// token is submitted with the form. The token is kept in localStorage,
+// so choosing the same file again after a dropped connection or a
+// reload carries on from the offset the server reports.
+(function () {
+    'use strict';
+
+    const RETRIES = 5;
+
+    function csrfToken() {
+        const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+        return match ? decodeURIComponent(match[1]) : '';
+    }
+
+    async function sha256(buffer) {
+        const digest = await crypto.subtle.digest('SHA-256', buffer);
+        return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    async function request(url, options) {
+        const response = await fetch(url, Object.assign({credentials: 'same-origin'}, options));
+        let body = {};
+        try {
+            body = await response.json();
+        } catch (e) {
+            // Proxies may answer with HTML; the status is enough.
+        }
+        if (!response.ok) {
+            const error = new Error(body.error || response.statusText);
+            error.status = response.status;
+            error.body = body;
+            throw error;
+        }
+        return body;
+    }
+
+    function sleep(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+
+    async function resume(key) {
+        const url = localStorage.getItem(key);
+        if (!url) {
+            return null;
+        }
+        try {
+            const status = await request(url, {method: 'GET'});
+            if (status.state !== 'F') {
+                return status;
+            }
+        } catch (e) {
+            // Expired or unknown upload: start over.
+        }
+        localStorage.removeItem(key);
+        return null;
+    }
+
+    async function start(url, file) {
+        return request(url, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json', 'X-CSRFToken': csrfToken()},
+            body: JSON.stringify({filename: file.name, size: file.size}),
+        });
+    }
+
+    async function sendChunk(status, buffer, checksum) {
+        for (let attempt = 0; ; attempt++) {
+            try {
+                return await request(status.url, {
+                    method: 'PATCH',
+                    headers: {
+                        'Content-Type': 'application/offset+octet-stream',
+                        'Upload-Offset': String(status.offset),
+                        'Upload-Checksum': 'sha256 ' + checksum,
+                        'X-CSRFToken': csrfToken(),
+                    },
+                    body: buffer,
+                });
+            } catch (e) {
+                if (e.status === 409 && e.body && e.body.offset !== undefined) {
+                    // The server is somewhere else; carry on from there.
+                    return Object.assign({url: status.url}, e.body);
+                }
+                const transient = !e.status || e.status >= 500 || e.status === 400;
+                if (!transient || attempt >= RETRIES) {
+                    throw e;
+                }
+                await sleep(1000 * 2 ** attempt);
+            }
+        }
+    }
+
+    async function upload(container, file) {
+        const chunkSize = parseInt(container.dataset.chunkSize, 10);
+        const key = ['chunked-upload', container.dataset.url, file.name, file.size, file.lastModified].join(':');
+        const progress = container.querySelector('progress');
+        const label = container.querySelector('.chunked-upload-status');
+
+        let status = await resume(key) || await start(container.dataset.url, file);
+        localStorage.setItem(key, status.url);
+        progress.hidden = false;
+        while (status.state === 'U') {
+            progress.value = file.size ? 100 * status.offset / file.size : 100;
+            label.textContent = 'Uploading ' + Math.floor(progress.value) + '%';
+            const buffer = await file.slice(status.offset, status.offset + chunkSize).arrayBuffer();
+            status = await sendChunk(status, buffer, await sha256(buffer));
+        }
+        localStorage.removeItem(key);
+        if (status.state !== 'C') {
+            throw new Error('Upload failed the final checksum.');
+        }
+        progress.value = 100;
+        label.textContent = 'Uploaded ' + file.name;
+        return status.token;
+    }
+
+    function bind(container) {
+        const input = container.querySelector('input[type=file]');
+        const token = container.querySelector('input[type=hidden]');
+        const form = input.form;
+        input.addEventListener('change', async function () {
+            const file = input.files[0];
+            if (!file) {
+                return;
+            }
+            const buttons = form.querySelectorAll('[type=submit]');
+            buttons.forEach(b => b.disabled = true);
+            try {
+                token.value = await upload(container, file);
+                // The bytes are on the server already; do not post them again.
+                input.value = '';
+            } catch (e) {
+                token.value = '';
+                container.querySelector('.chunked-upload-status').textContent = 'Upload failed: ' + e.message;
+            } finally {
+                buttons.forEach(b => b.disabled = false);
+            }
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('.chunked-upload').forEach(bind);
+    });
+})();
@@ -0,0 +1,183 @@
+import os
+import re
+import tempfile
+from hashlib import sha256
+from django.apps import apps
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+from imagekit import hashers
+from imagekit.cachefiles.namers import source_name_as_path
+from imagekit.utils import suggest_extension
+
+# Blob names: cas/<2 hex>/<2 hex>/<sha256>/<file name>. Two levels of
+# 256 directories keep every directory small however many files there
+# are. Each content directory holds one inode under every logical file
+# name it was uploaded as, so downloads keep their original names.
+CAS_DIR = 'cas'
+BLOB_NAME = re.compile(r'^%s/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})/' % CAS_DIR)
+BLOCK_SIZE = 64 * 1024
+
+def blob_name(digest, filename):
+    return '/'.join([CAS_DIR, digest[:2], digest[2:4], digest, filename])
+
+def blob_digest(name):
+    """The content hash in a blob name, or None for other names."""
+    match = BLOB_NAME.match(name or '')
+    return match.group(1) if match else None
+
+def referenced_blobs():
+    """
+    Blob names file fields point to, plus the digests of blobs linked
+    from text (images uploaded through markdownx live only in markdown).
+    """
+    names = set()
+    text_reg = re.compile(r'%s/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})/' % CAS_DIR)
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField):
+                names.update(model._default_manager.filter(
+                        **{field.name + '__startswith': CAS_DIR + '/'}
+                    ).values_list(field.name, flat=True))
+            elif isinstance(field, models.TextField):
+                for text in model._default_manager.filter(
+                        **{field.name + '__contains': CAS_DIR + '/'}
+                    ).values_list(field.name, flat=True).iterator():
+                    names.update(text_reg.findall(text))
+    return names
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores uploads by the SHA-256 of their content. The logical name a
+    FileField asks for (upload_to plus the client's file name) maps to
+    cas/ab/cd/<sha256>/<file name>: the directory comes from the content
+    and the file name from the upload. Identical uploads share one
+    inode, hard-linked under each distinct file name. Names written
+    outside the storage, such as the Zotero bibliographies, work as
+    before.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        """
+        Blob names never collide, so only trim the file name to fit.
+        """
+        filename = self.get_valid_name(os.path.basename(name))
+        if max_length:
+            room = max_length - len(blob_name('0' * 64, ''))
+            stem, ext = os.path.splitext(filename)
+            filename = stem[:max(room - len(ext), 1)] + ext
+        return os.path.join(os.path.dirname(name), filename)
+
+    def _save(self, name, content):
+        tmp_dir = self.path(os.path.join(CAS_DIR, 'tmp'))
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = sha256()
+        if hasattr(content, 'temporary_file_path'):
+            # Already on disk (large or chunked uploads): hash it there.
+            source, owned = content.temporary_file_path(), False
+            with open(source, 'rb') as f:
+                for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+                    digest.update(block)
+        else:
+            fd, source = tempfile.mkstemp(dir=tmp_dir)
+            owned = True
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+                    digest.update(chunk)
+        name = blob_name(digest.hexdigest(), os.path.basename(name))
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        existing = [f for f in os.listdir(directory) if f != os.path.basename(name)]
+        if os.path.exists(full_path) or (existing and self._link(existing[0], full_path)):
+            if owned:
+                os.remove(source)
+            return name
+        if not owned:
+            # Stage next to the blobs first (a copy if /tmp is another
+            # filesystem), so the final rename never exposes a partial file.
+            fd, staged = tempfile.mkstemp(dir=tmp_dir)
+            os.close(fd)
+            file_move_safe(source, staged, allow_overwrite=True)
+            source = staged
+        if self.file_permissions_mode is not None:
+            os.chmod(source, self.file_permissions_mode)
+        # Identical bytes, so losing a race to another writer is harmless.
+        os.replace(source, full_path)
+        return name
+
+    def _link(self, existing, full_path):
+        """
+        Hard-links a new file name to stored content. False where the
+        filesystem can't, and the content is then stored again.
+        """
+        try:
+            os.link(os.path.join(os.path.dirname(full_path), existing), full_path)
+        except FileExistsError:
+            pass
+        except OSError:
+            return False
+        return True
+
+    def delete(self, name):
+        """
+        Blobs may back several records, even under the same name, so
+        they are left in place; collect() removes them once unused.
+        """
+        if blob_digest(name):
+            return
+        super(ContentAddressedStorage, self).delete(name)
+
+    def collect(self, referenced, before, dry_run=False):
+        """
+        Removes blob names not in `referenced` (names, or digests that
+        keep every name of a blob) and stored before the `before`
+        timestamp, so uploads not yet saved to a record survive. A blob
+        goes with its last name, and its directories once empty. Staging
+        files left by interrupted saves go too. Returns the removed
+        names and the bytes freed.
+        """
+        removed, freed = [], 0
+        root = self.path(CAS_DIR)
+        for dirpath, dirnames, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, self.location).replace(os.sep, '/')
+                if name in referenced or blob_digest(name) in referenced:
+                    continue
+                stat = os.stat(path)
+                # Hard-linking a new name updates ctime, not mtime.
+                if max(stat.st_mtime, stat.st_ctime) >= before:
+                    continue
+                removed.append(name)
+                if stat.st_nlink == 1:
+                    freed += stat.st_size
+                if not dry_run:
+                    os.remove(path)
+        if not dry_run:
+            for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+                if dirpath != root and not os.listdir(dirpath):
+                    os.rmdir(dirpath)
+        return removed, freed
+
+def content_namer(generator):
+    """
+    Imagekit cache file namer keyed on the source's content hash, so a
+    spec generated for one copy of an image serves every duplicate.
+    Sources stored under other names fall back to source_name_as_path.
+    """
+    source = getattr(generator.source, 'name', None)
+    digest = blob_digest(source)
+    if not digest:
+        return source_name_as_path(generator)
+    spec = hashers.pickle([
+        digest,
+        generator.processors,
+        generator.format,
+        generator.options,
+        generator.autoconvert,
+    ])
+    ext = suggest_extension(source, generator.format)
+    return '/'.join([settings.IMAGEKIT_CACHEFILE_DIR, digest[:2], digest[2:4], digest, spec + ext])
@@ -0,0 +1,60 @@
+import time
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import Library
+from . import sitewide
+
+def claim():
+    """
+    Mark the oldest queued library as running and return it.
+    Rows locked by other workers are skipped; libraries left running
+    by a dead worker are claimed again once stale.
+    """
+    with transaction.atomic():
+        library = Library.objects.select_for_update(
+                skip_locked=True
+            ).filter(
+                Q(sync_state='Q') | Q(sync_state='R', modified_at__lt=Library.stale_before())
+            ).order_by('modified_at').first()
+        if library:
+            Library.objects.filter(pk=library.pk).update(sync_state='R', modified_at=timezone.now())
+    return library
+
+def run(library):
+    """
+    Sync a library with Zotero, record how it went and queue renders
+    for the posts citing entries that changed.
+    """
+    start = time.monotonic()
+    try:
+        changed = library.sync()
+    except Exception as e:
+        Library.objects.filter(pk=library.pk).update(
+            sync_state='F',
+            sync_error=repr(e),
+            sync_duration=timedelta(seconds=time.monotonic() - start)
+        )
+        return
+    Library.objects.filter(pk=library.pk).update(
+        sync_state='D',
+        sync_error='',
+        last_synced=timezone.now(),
+        sync_duration=timedelta(seconds=time.monotonic() - start),
+        item_count=library.bibentry_set.count()
+    )
+    sitewide.invalidate()
+    library.queue_renders(changed)
+
+def work():
+    """
+    Sync queued libraries one at a time. Returns the number synced.
+    """
+    done = 0
+    library = claim()
+    while library:
+        run(library)
+        done += 1
+        library = claim()
+    return done
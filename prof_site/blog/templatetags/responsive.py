@@ -0,0 +1,31 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+from ..images import VARIANT_FORMATS
+
+register = template.Library()
+
+def _srcset(ladder):
+    return ', '.join('{} {}w'.format(url, width) for width, url in ladder)
+
+@register.simple_tag
+def picture(obj, field, sizes='100vw', alt='', css_class='', loading='lazy', fallback=''):
+    """
+    Emits a <picture> for an object's image from its manifest: one
+    <source> per variant format, best first, and a JPEG <img> carrying
+    its own srcset. Until variants exist it shows `fallback`, or else
+    the original image. Pass loading='eager' for images above the fold.
+    """
+    ladders = obj.image_manifest.get('variants', {})
+    css = format_html(' class="{}"', css_class) if css_class else ''
+    jpeg = ladders.get('image/jpeg')
+    if not jpeg:
+        image = getattr(obj, field)
+        return format_html('<img{} src="{}" alt="{}">', css, fallback or (image.url if image else ''), alt)
+    sources = format_html_join('', '<source type="{}" srcset="{}" sizes="{}">', (
+        (mime, _srcset(ladders[mime]), sizes)
+        for _, mime in VARIANT_FORMATS if mime != 'image/jpeg' and mime in ladders
+    ))
+    return format_html(
+        '<picture>{}<img{} src="{}" srcset="{}" sizes="{}" alt="{}" loading="{}"></picture>',
+        sources, css, jpeg[-1][1], _srcset(jpeg), sizes, alt, loading
+    )
@@ -1,3 +1,1059 @@
-from django.test import TestCase
+import json
+import os
+import requests
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+from django.contrib import admin
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.contrib.auth.models import User
+from django.contrib.gis.geos import Point
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.http import JsonResponse
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from io import BytesIO, StringIO
+from .models import (Affiliation, Award, ChunkedUpload, CitationStyle, Committee_Membership, Conference,
+    ConferenceInstance, Education, Event, GeocodeCache, Institution, Library, Person, Place, Post, RenderCache,
+    RenderJob, SiteWideSetting)
+from . import geocode, images, pandoc, render, signals, sitewide, storage, sync, vita, zotero_update
+from .context_processors import main_author
+from .processors import GrayOverlay
+from .widgets import ChunkedFileWidget
+from hashlib import sha256
+from imagekit.processors import Adjust, ColorOverlay
+import numpy as np
 
-# Create your tests here.
+ZOTERO_ITEMS = [
+    {
+        'key': 'ABCD2345',
+        'version': 7,
+        'data': {'itemType': 'book', 'collections': []},
+        'bibtex': '\n@book{doe_book_1999,\n\ttitle = {A Book},\n\tyear = {1999}\n}\n',
+    },
+    {
+        'key': 'EFGH6789',
+        'version': 7,
+        'data': {'itemType': 'note', 'collections': []},
+    },
+]
+
+class ZoteroStub(BaseHTTPRequestHandler):
+    """
+    Answers item and deletion requests the way the Zotero API does.
+    """
+    items = ZOTERO_ITEMS
+    deleted = []
+    version = 7
+    # Requests still to be answered 429 with this Retry-After.
+    throttle = 0
+    retry_after = '0'
+    requests = 0
+
+    def do_GET(self):
+        ZoteroStub.requests += 1
+        if self.throttle:
+            ZoteroStub.throttle -= 1
+            self.send_response(429)
+            self.send_header('Retry-After', self.retry_after)
+            self.end_headers()
+            return
+        query = parse_qs(urlparse(self.path).query)
+        start = int(query.get('start', ['0'])[0])
+        limit = int(query.get('limit', [len(self.items)])[0])
+        body = json.dumps(
+            {'items': self.deleted} if '/deleted' in self.path else self.items[start:start + limit]
+        ).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Last-Modified-Version', str(self.version))
+        self.send_header('Total-Results', str(len(self.items)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class LibrarySyncTests(TestCase):
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), ZoteroStub)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.media = tempfile.TemporaryDirectory()
+        ZoteroStub.throttle = ZoteroStub.requests = 0
+        settings = override_settings(
+            ZOTERO_ENDPOINT='http://127.0.0.1:%d' % self.server.server_port,
+            MEDIA_ROOT=self.media.name
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # CSL-JSON conversion needs the pandoc binary.
+        patcher = mock.patch('blog.models.bibtex_to_csljson', return_value=[])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.media.cleanup()
+
+    def serve(self, version, items, deleted=()):
+        """
+        What the Zotero stub reports from now on.
+        """
+        ZoteroStub.version, ZoteroStub.items, ZoteroStub.deleted = version, items, list(deleted)
+        self.addCleanup(setattr, ZoteroStub, 'items', ZOTERO_ITEMS)
+        self.addCleanup(setattr, ZoteroStub, 'deleted', [])
+        self.addCleanup(setattr, ZoteroStub, 'version', 7)
+
+    def item(self, key, citekey, title='A Book', collections=()):
+        return {
+            'key': key,
+            'version': 7,
+            'data': {'itemType': 'book', 'collections': list(collections)},
+            'bibtex': '\n@book{%s,\n\ttitle = {%s},\n\tyear = {1999}\n}\n' % (citekey, title),
+        }
+
+    def keys(self, library):
+        return set(library.bibentry_set.values_list('key', flat=True))
+
+    def test_sync_diffs_entries(self):
+        library = Library.objects.create(name='Site', zotero_id=1, kind='user')
+        self.serve(7, [self.item('ITEM0001', 'doe_1999'), self.item('ITEM0002', 'roe_1999')])
+        self.assertEqual(library.sync(), {'doe_1999', 'roe_1999'})
+        # Unchanged entries are not reported.
+        self.serve(8, [self.item('ITEM0001', 'doe_1999'), self.item('ITEM0002', 'roe_1999')])
+        self.assertEqual(library.sync(), set())
+        # An edited entry is.
+        self.serve(9, [self.item('ITEM0002', 'roe_1999', title='Revised')])
+        self.assertEqual(library.sync(), {'roe_1999'})
+        # A changed citekey reports both the old and the new key.
+        self.serve(10, [self.item('ITEM0001', 'doe_2000')])
+        self.assertEqual(library.sync(), {'doe_1999', 'doe_2000'})
+        self.assertEqual(self.keys(library), {'doe_2000', 'roe_1999'})
+        # A deleted item drops its entry.
+        self.serve(11, [], deleted=['ITEM0002'])
+        self.assertEqual(library.sync(), {'roe_1999'})
+        self.assertEqual(self.keys(library), {'doe_2000'})
+
+    def test_item_leaving_collection(self):
+        library = Library.objects.create(name='Site', zotero_id=1, kind='user', collection='COLL0001')
+        self.serve(7, [self.item('ITEM0001', 'doe_1999', collections=['COLL0001']),
+            self.item('ITEM0002', 'roe_1999', collections=['COLL0001'])])
+        self.assertEqual(library.sync(), {'doe_1999', 'roe_1999'})
+        self.serve(8, [self.item('ITEM0002', 'roe_1999', collections=[])])
+        self.assertEqual(library.sync(), {'roe_1999'})
+        self.assertEqual(self.keys(library), {'doe_1999'})
+        with open(os.path.join(self.media.name, str(library.bib_file))) as f:
+            self.assertNotIn('roe_1999', f.read())
+
+    def test_save_only_queues(self):
+        library = Library.objects.create(name='Site', zotero_id=1, kind='user')
+        self.assertEqual(library.sync_state, 'Q')
+        self.assertFalse(library.bibentry_set.exists())
+
+    def test_stale_running_sync_is_reclaimed(self):
+        library = Library.objects.create(name='Site', zotero_id=1, kind='user')
+        Library.objects.filter(pk=library.pk).update(sync_state='R')
+        self.assertIsNone(sync.claim())
+        Library.objects.filter(pk=library.pk).update(
+            modified_at=timezone.now() - timedelta(minutes=31)
+        )
+        self.assertEqual(sync.claim(), library)
+        self.assertIsNone(sync.claim())
+
+    def test_sync_job(self):
+        library = Library.objects.create(name='Site', zotero_id=1, kind='user')
+        self.assertEqual(sync.work(), 1)
+        library.refresh_from_db()
+        self.assertEqual(library.sync_state, 'D')
+        self.assertEqual(library.version, 7)
+        self.assertEqual(library.item_count, 1)
+        self.assertIsNotNone(library.last_synced)
+        self.assertEqual(
+            list(library.bibentry_set.values_list('key', 'item_key')),
+            [('doe_book_1999', 'ABCD2345')]
+        )
+        with open(os.path.join(self.media.name, str(library.bib_file))) as f:
+            self.assertIn('@book{doe_book_1999', f.read())
+
+    def test_paged_sync_waits_out_rate_limit(self):
+        library = Library.objects.create(name='Site', zotero_id=1, kind='user')
+        self.serve(7, [self.item('ITEM%04d' % i, 'doe_%d' % i) for i in range(250)])
+        ZoteroStub.throttle, ZoteroStub.retry_after = 1, '0.2'
+        self.addCleanup(setattr, ZoteroStub, 'retry_after', '0')
+        start = time.monotonic()
+        with self.settings(ZOTERO_WORKERS=2):
+            self.assertEqual(len(library.sync()), 250)
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        # One throttled request, then three pages of 100.
+        self.assertEqual(ZoteroStub.requests, 4)
+        self.assertEqual(len(self.keys(library)), 250)
+
+    def test_rate_limit_retries_capped(self):
+        library = Library.objects.create(name='Site', zotero_id=1, kind='user')
+        ZoteroStub.throttle = 100
+        with self.settings(ZOTERO_RETRIES=2), self.assertRaises(requests.HTTPError):
+            library.sync()
+        self.assertEqual(ZoteroStub.requests, 3)
+
+    def test_rollback(self):
+        library = Library.objects.create(name='Site', zotero_id=1, kind='user')
+        self.assertEqual(library.rollback(), set())
+        self.serve(7, [self.item('ITEM0001', 'doe_1999'), self.item('ITEM0002', 'roe_1999')])
+        library.sync()
+        self.serve(8, [self.item('ITEM0002', 'roe_1999', title='Revised')])
+        library.sync()
+        self.assertEqual(library.rollback(), {'roe_1999'})
+        self.assertIsNone(Library.objects.get(pk=library.pk).version)
+        self.assertEqual(self.keys(library), {'doe_1999', 'roe_1999'})
+        self.assertNotIn('Revised', library.bibentry_set.get(key='roe_1999').bibtex)
+        with open(os.path.join(self.media.name, str(library.bib_file))) as f:
+            self.assertNotIn('Revised', f.read())
+
+    def test_index_csl_json(self):
+        library = Library.objects.create(name='Site', zotero_id=1, kind='user')
+        self.serve(7, [self.item('ITEM0001', 'doe_1999'), self.item('ITEM0002', 'roe_1999')])
+        library.sync()
+        self.assertFalse(library.bibentry_set.filter(csl_json__isnull=False).exists())
+        # Pandoc converted only one of the entries.
+        item = {'id': 'doe_1999', 'type': 'book', 'title': 'A Book'}
+        with mock.patch('blog.models.bibtex_to_csljson', return_value=[item]) as convert:
+            library.index_csl_json()
+        self.assertIn('@book{roe_1999', convert.call_args[0][0])
+        self.assertEqual(
+            dict(library.bibentry_set.values_list('key', 'csl_json')),
+            {'doe_1999': item, 'roe_1999': None}
+        )
+        with open(os.path.join(self.media.name, str(library.json_file))) as f:
+            self.assertEqual(json.load(f), [item])
+
+    def test_queue_renders_only_citing_posts(self):
+        library = Library.objects.create(name='Site', zotero_id=1, kind='user')
+        SiteWideSetting.objects.create(main_person=Person.objects.create(first='Jane', last='Doe'), library=library)
+        self.serve(7, [self.item('ITEM0001', 'doe_1999'), self.item('ITEM0002', 'roe_1999')])
+        library.queue_renders(library.sync())
+        posts = [
+            Post.objects.create(title=title, content=content, display_datetime=timezone.now())
+            for title, content in [('Doe', 'As [@doe_1999] says.'), ('Roe', 'As [@roe_1999] says.'), ('Plain', 'None.')]
+        ]
+        keys = render.render_keys(posts, None, library)
+        RenderJob.objects.all().delete()
+        self.serve(8, [self.item('ITEM0002', 'roe_1999', title='Revised')])
+        library.queue_renders(library.sync())
+        self.assertEqual(list(RenderJob.objects.values_list('post_id', flat=True)), [posts[1].pk])
+        changed = render.render_keys(posts, None, library)
+        self.assertEqual([keys[p.pk] != changed[p.pk] for p in posts], [False, True, False])
+
+    def test_pruned_bib(self):
+        library = Library.objects.create(name='Site', zotero_id=1, kind='user')
+        self.serve(7, [self.item('ITEM0001', 'doe_1999'), self.item('ITEM0002', 'roe_1999')])
+        library.sync()
+        with library.pruned_bib(set()) as path:
+            self.assertIsNone(path)
+        with library.pruned_bib({'roe_1999', 'zed_2000'}) as path:
+            self.assertTrue(path.endswith('.bib'))
+            with open(path) as f:
+                bibtex = f.read()
+        self.assertIn('@book{roe_1999', bibtex)
+        self.assertNotIn('doe_1999', bibtex)
+        self.assertFalse(os.path.exists(path))
+        item = {'id': 'roe_1999', 'type': 'book'}
+        library.bibentry_set.filter(key='roe_1999').update(csl_json=item)
+        with library.pruned_bib({'roe_1999'}) as path:
+            with open(path) as f:
+                self.assertEqual(json.load(f), [item])
+        self.assertFalse(os.path.exists(path))
+
+    def test_missing_keys(self):
+        library = Library.objects.create(name='Site', zotero_id=1, kind='user')
+        self.serve(7, [self.item('ITEM0001', 'doe_1999')])
+        library.sync()
+        self.assertEqual(library.missing_keys({'doe_1999', 'roe_1999'}), {'roe_1999'})
+        self.assertEqual(library.missing_keys(set()), set())
+
+
+class AtomicWriteTests(SimpleTestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.path = os.path.join(media.name, 'bibs', 'library_1.bib')
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def test_history_rotation(self):
+        for version in range(1, 5):
+            with zotero_update.atomic_write(self.path, keep=2) as f:
+                f.write('v%d' % version)
+        self.assertEqual(self.read(self.path), 'v4')
+        self.assertEqual(self.read(self.path + '.1'), 'v3')
+        self.assertEqual(self.read(self.path + '.2'), 'v2')
+        self.assertEqual(sorted(os.listdir(os.path.dirname(self.path))),
+            ['library_1.bib', 'library_1.bib.1', 'library_1.bib.2'])
+        self.assertTrue(zotero_update.restore_previous(self.path, 2))
+        self.assertEqual(self.read(self.path), 'v3')
+        self.assertEqual(self.read(self.path + '.1'), 'v2')
+        self.assertFalse(os.path.exists(self.path + '.2'))
+
+    def test_threads_get_their_own_temp_file(self):
+        writing = threading.Barrier(2)
+
+        def write(text):
+            with zotero_update.atomic_write(self.path) as f:
+                f.write(text)
+                writing.wait(5)
+        threads = [threading.Thread(target=write, args=(text,)) for text in ('a' * 100, 'b' * 100)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIn(self.read(self.path), ('a' * 100, 'b' * 100))
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['library_1.bib'])
+
+class GeocoderStub(BaseHTTPRequestHandler):
+    """
+    Answers every query with the same point, counting requests.
+    """
+    requests = 0
+
+    def do_GET(self):
+        GeocoderStub.requests += 1
+        body = json.dumps({
+            'results': [{'geometry': {'lat': 42.3601, 'lng': -71.0942}}],
+            'status': {'code': 200},
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class GeocodeMissingTests(TestCase):
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), GeocoderStub)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        settings = override_settings(
+            OPENCAGE_URL='http://127.0.0.1:%d/' % self.server.server_port
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        GeocoderStub.requests = 0
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_dedupes_and_updates(self):
+        # bulk_create skips save(), which would geocode each row.
+        Institution.objects.bulk_create([
+            Institution(name=name, address='77 Massachusetts Ave', city='Cambridge',
+                state='MA', country='USA')
+            for name in ('MIT', 'DUSP', 'Lab')
+        ])
+        call_command('geocode_missing', rate=100, stdout=open(os.devnull, 'w'))
+        self.assertEqual(GeocoderStub.requests, 1)
+        self.assertFalse(Institution.objects.filter(location__isnull=True).exists())
+        call_command('geocode_missing', rate=100, stdout=open(os.devnull, 'w'))
+        self.assertEqual(GeocoderStub.requests, 1)
+
+@override_settings(GEOCODE_TTL=365, GEOCODE_NEGATIVE_TTL=7)
+class GeocodeCacheTests(TestCase):
+    def test_ttl(self):
+        point = Point(-71.09, 42.36, srid=4326)
+        with mock.patch('blog.geocode.geocode_address', return_value=point) as remote:
+            self.assertEqual(geocode.geocode('77 Massachusetts Ave', 'Cambridge', 'MA', '', 'USA'), point)
+            self.assertEqual(geocode.geocode('77  massachusetts ave', 'cambridge', 'ma', '', 'usa'), point)
+            self.assertEqual(remote.call_count, 1)
+            hit = GeocodeCache.objects.get()
+            self.assertGreater(hit.expires_at, timezone.now() + timedelta(days=364))
+            GeocodeCache.objects.update(expires_at=timezone.now())
+            geocode.geocode('77 Massachusetts Ave', 'Cambridge', 'MA', '', 'USA')
+            self.assertEqual(remote.call_count, 2)
+
+    def test_failures_cached_briefly(self):
+        with mock.patch('blog.geocode.geocode_address', return_value=None) as remote:
+            self.assertIsNone(geocode.geocode('Nowhere Rd', 'Atlantis', '', '', ''))
+            self.assertIsNone(geocode.geocode('Nowhere Rd', 'Atlantis', '', '', ''))
+            self.assertEqual(remote.call_count, 1)
+        hit = GeocodeCache.objects.get()
+        self.assertIsNone(hit.location)
+        self.assertLess(hit.expires_at, timezone.now() + timedelta(days=8))
+
+    def test_gazetteer(self):
+        ma = Point(-71.11, 42.37, srid=4326)
+        uk = Point(0.12, 52.21, srid=4326)
+        Place.objects.create(name='Cambridge', admin1='Massachusetts', admin1_code='MA',
+            country='United States', country_code='US', population=118000, location=ma)
+        Place.objects.create(name='Cambridge', admin1='England', admin1_code='ENG',
+            country='United Kingdom', country_code='GB', population=145000, location=uk)
+        self.assertEqual(geocode.gazetteer('cambridge', 'MA', 'US'), ma)
+        self.assertEqual(geocode.gazetteer('Cambridge', 'Massachusetts', ''), ma)
+        self.assertEqual(geocode.gazetteer('CAMBRIDGE', '', ''), uk)
+        self.assertIsNone(geocode.gazetteer('Springfield', '', ''))
+        with mock.patch('blog.geocode.geocode_address') as remote:
+            self.assertEqual(geocode.geocode('', 'Cambridge', 'MA', '', 'US'), ma)
+            remote.assert_not_called()
+            # Street addresses need more than the city's location.
+            geocode.geocode('77 Massachusetts Ave', 'Cambridge', 'MA', '', 'US')
+            remote.assert_called_once()
+
+class InstitutionPathTests(TestCase):
+    def make(self, name, parent=None):
+        return Institution.objects.create(name=name, city='Cambridge', state='MA',
+            country='USA', parent=parent, location=Point(-71.09, 42.36))
+
+    def test_path_follows_moves_and_deletes(self):
+        mit = self.make('MIT')
+        sap = self.make('SA+P', mit)
+        dusp = self.make('DUSP', sap)
+        lab = self.make('Lab', dusp)
+        self.assertEqual(list(mit.descendants()), [sap, dusp, lab])
+        self.assertEqual(list(lab.ancestors()), [dusp, sap, mit])
+        dusp.parent = mit
+        dusp.save()
+        lab.refresh_from_db()
+        self.assertEqual(lab.breadcrumb(), [lab, dusp, mit])
+        self.assertEqual(lab.depth, 2)
+        mit.delete()
+        lab.refresh_from_db()
+        self.assertEqual(lab.path, '{}/{}/'.format(dusp.pk, lab.pk))
+        self.assertEqual(lab.depth, 1)
+        with self.assertRaises(ValueError):
+            dusp.parent = lab
+            dusp.save()
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class VitaQueryTests(TestCase):
+    # Setting, person, three education/advisee queries with their
+    # committees, two affiliation queries, two award queries with their
+    # grantees, and one for every institution's parent chain.
+    MAX_QUERIES = 13
+
+    def setUp(self):
+        self.person = Person.objects.create(first='Jane', last='Doe')
+        self.student = Person.objects.create(first='John', last='Roe')
+        SiteWideSetting.objects.create(main_person=self.person)
+        root = None
+        for name in ('MIT', 'SA+P', 'DUSP'):
+            root = Institution.objects.create(name=name, city='Cambridge', state='MA',
+                country='USA', parent=root, location=Point(-71.09, 42.36))
+        self.institution = root
+
+    def add_entries(self, n):
+        for i in range(n):
+            education = Education.objects.create(person=self.person,
+                institution=self.institution, start='2010-01-01', end='2014-01-01')
+            Committee_Membership.objects.create(person=self.student, education=education)
+            advisee = Education.objects.create(person=self.student,
+                institution=self.institution, start='2015-01-01')
+            Committee_Membership.objects.create(person=self.person, education=advisee)
+            for kind in ('App', 'Aff'):
+                Affiliation.objects.create(person=self.person, institution=self.institution,
+                    start='2016-01-01', kind=kind)
+            for kind in ('A', 'F'):
+                award = Award.objects.create(pi_awardee=self.person, grantor=self.institution,
+                    start='2017-01-01', name='Award %d' % i, kind=kind)
+                award.grantees.add(self.institution)
+
+    def vita_queries(self, build=vita.vita_data):
+        with CaptureQueriesContext(connection) as queries:
+            build()
+        return len(queries)
+
+    def test_query_count_is_constant(self):
+        self.add_entries(1)
+        few = self.vita_queries()
+        self.add_entries(10)
+        many = self.vita_queries()
+        self.assertEqual(few, many)
+        self.assertLessEqual(many, self.MAX_QUERIES)
+
+    def test_fast_path_query_count_is_constant(self):
+        # /api/vita/ is built by fast_vita_data(); deeper institution
+        # chains must not cost more queries either.
+        self.add_entries(1)
+        few = self.vita_queries(vita.fast_vita_data)
+        for name in ('Lab', 'Group'):
+            self.institution = Institution.objects.create(name=name, city='Cambridge', state='MA',
+                country='USA', parent=self.institution, location=Point(-71.09, 42.36))
+        self.add_entries(10)
+        many = self.vita_queries(vita.fast_vita_data)
+        self.assertEqual(few, many)
+        self.assertLessEqual(many, self.MAX_QUERIES)
+
+    def test_fast_path_matches_drf(self):
+        self.add_entries(2)
+        Education.objects.create(person=self.person, institution=self.institution,
+            start='2008-01-01', degree='PhD', desc='Caf\u00e9 "quoted"')
+        self.assertEqual(
+            json.dumps(vita.fast_vita_data()).encode('utf-8'),
+            JsonResponse(vita.vita_data()).content
+        )
+
+    def test_conditional_requests(self):
+        self.add_entries(1)
+        response = self.client.get(reverse('blog:vita_json'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), vita.vita_data())
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('blog:vita_json'),
+                HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        Award.objects.filter(kind='A').delete()
+        response = self.client.get(reverse('blog:vita_json'),
+            HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['awards'], [])
+
+    def test_rebuilt_once_per_transaction(self):
+        # Everything since setUp is one transaction (the test's).
+        self.add_entries(2)
+        scheduled = [entry[1] for entry in connection.run_on_commit]
+        self.assertEqual(scheduled.count(signals.rebuild_vita), 1)
+
+    def test_grantee_changes_advance_last_modified(self):
+        self.add_entries(1)
+        award = Award.objects.first()
+        before = vita.last_modified()
+        award.grantees.add(Institution.objects.create(name='Lab', city='Cambridge', state='MA',
+            country='USA', location=Point(-71.09, 42.36)))
+        Institution.objects.update(modified_at=before)
+        added = vita.last_modified()
+        self.assertGreater(added, before)
+        award.grantees.clear()
+        self.assertGreater(vita.last_modified(), added)
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class SitewideCacheTests(TestCase):
+    def test_cached_until_changed(self):
+        person = Person.objects.create(first='Jane', last='Doe')
+        setting = SiteWideSetting.objects.create(main_person=person)
+        self.assertEqual(sitewide.setting(), setting)
+        with self.assertNumQueries(0):
+            self.assertEqual(main_author(None)['main_author'], person)
+        other = Person.objects.create(first='John', last='Roe')
+        setting.main_person = other
+        setting.save()
+        self.assertEqual(sitewide.main_person(), other)
+
+def png(color=(0, 0, 0)):
+    """
+    A tiny PNG for image fields.
+    """
+    image = BytesIO()
+    Image.new('RGB', (16, 9), color).save(image, 'PNG')
+    return image.getvalue()
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class IndexQueryTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.person = Person.objects.create(first='Jane', last='Doe', page=True,
+            vita=SimpleUploadedFile('vita.pdf', b'%PDF-1.4'))
+        self.coauthor = Person.objects.create(first='John', last='Roe')
+        SiteWideSetting.objects.create(main_person=self.person)
+        self.institution = Institution.objects.create(name='MIT', city='Cambridge',
+            state='MA', country='USA', location=Point(-71.09, 42.36))
+        conference = Conference.objects.create(name='ACSP')
+        conference.organizations.add(self.institution)
+        self.conference = ConferenceInstance.objects.create(conference=conference,
+            start='2030-10-01', end='2030-10-04', city='Boston', state='MA',
+            country='USA', location=Point(-71.06, 42.36))
+
+    def add_posts(self, n):
+        for i in range(n):
+            post = Post.objects.create(title='Post', content='Text.',
+                display_datetime=timezone.now(),
+                banner=SimpleUploadedFile('banner.png', png()))
+            post.authors.add(self.person, self.coauthor)
+            event = Event.objects.create(day=timezone.now().date(), start='09:00',
+                end='10:00', title='Talk', desc='', conference=self.conference)
+            event.sponsors.add(self.institution)
+
+    def index_queries(self, **headers):
+        sitewide.setting()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('blog:index'), **headers)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_is_constant(self):
+        self.add_posts(3)
+        few = self.index_queries()
+        self.add_posts(12)
+        self.assertEqual(self.index_queries(), few)
+
+    def test_page_requests_skip_sidebar(self):
+        self.add_posts(3)
+        full = self.index_queries()
+        self.assertLess(self.index_queries(HTTP_X_REQUESTED_WITH='XMLHttpRequest'), full)
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ImageManifestTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_generates_specs_once_per_banner(self):
+        post = Post.objects.create(title='Post', content='Text.',
+            display_datetime=timezone.now(),
+            banner=SimpleUploadedFile('banner.png', png()))
+        self.assertEqual(images.work(2), 1)
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual(post.image_manifest['source'], post.banner.name)
+        for spec in ('banner_thumb', 'banner_reduced'):
+            self.assertEqual(post.image_manifest[spec], getattr(post, spec).url)
+        self.assertEqual([w for w, url in post.image_manifest['variants']['image/jpeg']], [16])
+        html = Template("{% load responsive %}{% picture post 'banner' %}").render(Context({'post': post}))
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn(' 16w"', html)
+        html = Template("{% load responsive %}{% picture post 'banner' loading='eager' %}").render(Context({'post': post}))
+        self.assertIn('loading="eager"', html)
+        person = Person.objects.create(first='Jane', last='Doe', page=True,
+            vita=SimpleUploadedFile('vita.pdf', b'%PDF-1.4'))
+        SiteWideSetting.objects.create(main_person=person)
+        html = self.client.get(reverse('blog:post_detail', args=[post.slug])).content.decode()
+        self.assertIn('srcset=', html)
+        self.assertNotIn('background-image', html)
+        self.assertEqual(images.work(2), 0)
+        post.banner = SimpleUploadedFile('other.png', png())
+        post.save()
+        self.assertEqual(Post.objects.get(pk=post.pk).image_manifest, {})
+
+    def test_stale_claims_are_retried(self):
+        post = Post.objects.create(title='Post', content='Text.',
+            display_datetime=timezone.now(),
+            banner=SimpleUploadedFile('banner.png', png()))
+        self.assertEqual(images.claim(Post, 10), [post])
+        self.assertEqual(images.claim(Post, 10), [])
+        Post.objects.filter(pk=post.pk).update(image_manifest={'generating': time.time() - 31 * 60})
+        self.assertEqual(images.claim(Post, 10), [post])
+
+class GrayOverlayTests(SimpleTestCase):
+    def test_matches_pilkit_chain(self):
+        rng = np.random.default_rng(0)
+        fused = GrayOverlay(color="#CC003E", overlay_opacity=0.6, brightness=1.5, contrast=1.5)
+        chain = [Adjust(color=0, contrast=1.5, brightness=1.5), ColorOverlay(color="#CC003E", overlay_opacity=0.6)]
+        for i in range(10):
+            pixels = rng.integers(0, 256, (rng.integers(1, 80), rng.integers(1, 80), 4), dtype=np.uint8)
+            for mode in ('RGBA', 'RGB', 'L', 'P'):
+                img = Image.fromarray(pixels, 'RGBA').convert(mode)
+                expected = img
+                for processor in chain:
+                    expected = processor.process(expected)
+                self.assertTrue(np.array_equal(np.asarray(fused.process(img)), np.asarray(expected)))
+
+class ChunkedUploadTests(TestCase):
+    DATA = os.urandom(1000)
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name, UPLOAD_CHUNK_SIZE=400)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.client.force_login(self.user)
+
+    def start(self, **data):
+        data = dict({'filename': '../vita.pdf', 'size': len(self.DATA)}, **data)
+        response = self.client.post(reverse('blog:upload_start'), json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def send(self, status, start, end, checksum=None):
+        chunk = self.DATA[start:end]
+        headers = {'HTTP_UPLOAD_OFFSET': str(start)}
+        if checksum is not False:
+            headers['HTTP_UPLOAD_CHECKSUM'] = 'sha256 ' + (checksum or sha256(chunk).hexdigest())
+        return self.client.generic('PATCH', status['url'], chunk,
+            content_type='application/offset+octet-stream', **headers)
+
+    def test_resumes_and_verifies(self):
+        status = self.start(sha256=sha256(self.DATA).hexdigest())
+        self.assertEqual(status['offset'], 0)
+        self.assertEqual(self.send(status, 0, 400).json()['offset'], 400)
+        # A corrupted chunk is refused and the offset stays put.
+        self.assertEqual(self.send(status, 400, 800, checksum='0' * 64).status_code, 400)
+        # A client that lost track learns where to resume.
+        self.assertEqual(self.send(status, 0, 400).status_code, 409)
+        self.assertEqual(self.client.get(status['url']).json()['offset'], 400)
+        self.assertEqual(self.send(status, 400, 801).status_code, 413)
+        self.send(status, 400, 800)
+        status = self.send(status, 800, 1000).json()
+        self.assertEqual(status['state'], 'C')
+        upload = ChunkedUpload.objects.get()
+        self.assertEqual(upload.filename, 'vita.pdf')
+        with open(upload.part_path, 'rb') as part:
+            self.assertEqual(part.read(), self.DATA)
+        # The admin widget hands the finished upload to the FileField.
+        widget = ChunkedFileWidget()
+        value = widget.value_from_datadict({'vita_upload': status['token']}, {}, 'vita')
+        # A form re-rendered with errors keeps the finished upload.
+        self.assertIn('value="%s"' % status['token'], widget.render('vita', None))
+        person = Person.objects.create(first='Jane', last='Doe', vita=value)
+        with person.vita.open('rb') as vita_file:
+            self.assertEqual(vita_file.read(), self.DATA)
+        self.assertFalse(os.path.exists(upload.part_path))
+
+    def test_file_checksum_mismatch_fails(self):
+        status = self.start(sha256='0' * 64)
+        self.send(status, 0, 400, checksum=False)
+        self.send(status, 400, 800, checksum=False)
+        response = self.send(status, 800, 1000, checksum=False)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['state'], 'F')
+        self.assertIsNone(ChunkedFileWidget().value_from_datadict({'vita_upload': status['token']}, {}, 'vita'))
+
+    def test_admin_form_checks_owner(self):
+        status = self.start()
+        self.send(status, 0, 400)
+        self.send(status, 400, 800)
+        self.send(status, 800, 1000)
+        other = User.objects.create_user('other', password='pw', is_staff=True)
+
+        def vita_errors(user, token):
+            request = RequestFactory().post('/')
+            request.user = user
+            form = admin.site._registry[Person].get_form(request)({'vita_upload': token})
+            form.is_valid()
+            return form.errors.get('vita')
+        self.assertIsNone(vita_errors(self.user, status['token']))
+        self.assertEqual(vita_errors(other, status['token']), ["That upload belongs to another user."])
+        self.assertIn("didn't finish", vita_errors(self.user, str(uuid.uuid4()))[0])
+
+    def test_staff_only(self):
+        self.client.logout()
+        response = self.client.post(reverse('blog:upload_start'),
+            json.dumps({'filename': 'a', 'size': 1}), content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_duplicates_share_blob_and_specs(self):
+        data = png()
+        first = Post.objects.create(title='One', content='Text.', display_datetime=timezone.now(), banner=SimpleUploadedFile('a.png', data))
+        second = Post.objects.create(title='Two', content='Text.', display_datetime=timezone.now(), banner=SimpleUploadedFile('b.PNG', data))
+        digest = sha256(data).hexdigest()
+        # Each record keeps its own file name over the one stored copy.
+        self.assertEqual(first.banner.name, storage.blob_name(digest, 'a.png'))
+        self.assertEqual(second.banner.name, storage.blob_name(digest, 'b.PNG'))
+        self.assertTrue(os.path.samefile(first.banner.path, second.banner.path))
+        self.assertEqual(first.banner_thumb.name, second.banner_thumb.name)
+        self.assertIn(digest, first.banner_thumb.name)
+        # Deleting one record's file keeps the blob for the other.
+        first.banner.delete(save=False)
+        self.assertTrue(second.banner.storage.exists(second.banner.name))
+
+    def test_collect_unreferenced(self):
+        data = png()
+        first = Post.objects.create(title='One', content='Text.', display_datetime=timezone.now(), banner=SimpleUploadedFile('a.png', data))
+        second = Post.objects.create(title='Two', content='Text.', display_datetime=timezone.now(), banner=SimpleUploadedFile('b.png', data))
+        inline = default_storage.save('markdownx/inline.png', SimpleUploadedFile('inline.png', png(color=(0, 0, 255))))
+        Post.objects.create(title='Three', content='![](%s)' % default_storage.url(inline), display_datetime=timezone.now())
+        orphan = default_storage.save('attach/orphan.txt', SimpleUploadedFile('orphan.txt', b'orphan'))
+        first.delete()
+
+        def collect(**options):
+            out = StringIO()
+            call_command('collect_blobs', stdout=out, **options)
+            return out.getvalue().splitlines()[:-1]
+        # Fresh files may belong to a record still being saved.
+        self.assertEqual(collect(), [])
+        self.assertEqual(sorted(collect(min_age=0, dry_run=True)), sorted([first.banner.name, orphan]))
+        self.assertTrue(default_storage.exists(first.banner.name))
+        collect(min_age=0)
+        self.assertFalse(default_storage.exists(first.banner.name))
+        self.assertFalse(os.path.exists(os.path.dirname(default_storage.path(orphan))))
+        self.assertTrue(default_storage.exists(second.banner.name))
+        self.assertTrue(default_storage.exists(inline))
+        second.delete()
+        collect(min_age=0)
+        self.assertFalse(os.path.exists(os.path.dirname(default_storage.path(second.banner.name))))
+
+    def test_other_names_unchanged(self):
+        blob = storage.ContentAddressedStorage()
+        os.makedirs(blob.path('bibs'))
+        with open(blob.path('bibs/library.bib'), 'w') as f:
+            f.write('@book{}')
+        self.assertTrue(blob.exists('bibs/library.bib'))
+        self.assertIsNone(storage.blob_digest('bibs/library.bib'))
+        blob.delete('bibs/library.bib')
+        self.assertFalse(blob.exists('bibs/library.bib'))
+
+class PandocBatchTests(SimpleTestCase):
+    def test_split_batch(self):
+        html = (
+            '<!-- pandocify:0 -->\n<p>a</p>\n'
+            '<!-- pandocify:1 -->\n<pre><code>&lt;!-- pandocify:2 --&gt;</code></pre>\n'
+            '<!-- pandocify:3 -->\n<p>d</p>\n'
+        )
+        # 2 was swallowed by 1, so neither piece can be trusted.
+        self.assertEqual(pandoc._split_batch(html, [0, 1, 2, 3]), {0: '<p>a</p>\n', 3: '<p>d</p>\n'})
+
+    def test_batchable(self):
+        self.assertTrue(pandoc._batchable('Mail me at jane@example.com.'))
+        for content in ['See [@doe, p. 3].', '[-@doe]', '@{doe:2020}', 'Text.[^1]\n\n[^1]: Note.',
+                'Text.^[Inline note.]', '## Intro', 'Intro\n=====']:
+            self.assertFalse(pandoc._batchable(content), content)
+
+    @mock.patch('blog.pandoc.pandocify', side_effect=lambda content, csl, bib: 'alone:' + content)
+    def test_missing_piece_rendered_alone(self, pandocify):
+        contents = ['a', '```\nunclosed', 'c', 'd', '## Heading']
+        batched = (
+            '<!-- pandocify:0 -->\n<p>a</p>\n'
+            '<!-- pandocify:1 -->\n<pre><code>unclosed</code></pre>\n'
+            '<!-- pandocify:3 -->\n<p>d</p>\n'
+        )
+        with mock.patch('blog.pandoc.pypandoc.convert_text', return_value=batched):
+            results = pandoc.pandocify_batch(contents, None, None)
+        self.assertEqual(results, ['<p>a</p>\n', 'alone:```\nunclosed', 'alone:c', '<p>d</p>\n', 'alone:## Heading'])
+
+    def test_failure_stays_with_its_document(self):
+        def pandocify(content, csl, bib):
+            if content == 'bad':
+                raise RuntimeError('pandoc failed')
+            return 'alone:' + content
+        with mock.patch('blog.pandoc.pandocify', side_effect=pandocify), \
+                mock.patch('blog.pandoc.pypandoc.convert_text', side_effect=RuntimeError('pandoc failed')):
+            results = pandoc.pandocify_batch(['a', 'bad', 'c'], None, None)
+        self.assertEqual(results[0], 'alone:a')
+        self.assertIsInstance(results[1], RuntimeError)
+        self.assertEqual(results[2], 'alone:c')
+
+class RenderQueueTests(TestCase):
+    @staticmethod
+    def pandocify(content, csl, bib):
+        if 'bad' in content:
+            raise RuntimeError('pandoc failed')
+        return '<p>%s</p>\n' % content
+
+    def test_save_enqueues(self):
+        post = Post.objects.create(title='Post', content='Text.', display_datetime=timezone.now())
+        self.assertEqual(list(RenderJob.objects.values_list('post_id', 'state')), [(post.pk, 'P')])
+        post.save()
+        self.assertEqual(RenderJob.objects.count(), 1)
+
+    def test_work_stores_html(self):
+        post = Post.objects.create(title='Post', content='Text.', display_datetime=timezone.now())
+        with mock.patch('blog.pandoc.pandocify', side_effect=self.pandocify):
+            self.assertEqual(render.work(1), 1)
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual(post.html, '<p>Text.</p>\n')
+        self.assertEqual(post.excerpt, 'Text.')
+        self.assertIsNotNone(post.rendered_at)
+        self.assertEqual(RenderJob.objects.get(post=post).state, 'D')
+        self.assertEqual(render.work(1), 0)
+
+    @override_settings(RENDER_TIMEOUT=30, RENDER_ATTEMPTS=3)
+    def test_stale_and_failed_jobs_retried(self):
+        post = Post.objects.create(title='Post', content='Text.', display_datetime=timezone.now())
+        job = RenderJob.objects.get(post=post)
+        self.assertEqual(render.claim(10), [job])
+        # Running and fresh: another worker has it.
+        self.assertEqual(render.claim(10), [])
+        RenderJob.objects.filter(pk=job.pk).update(
+            modified_at=timezone.now() - timedelta(minutes=31)
+        )
+        self.assertEqual(render.claim(10), [job])
+        RenderJob.objects.filter(pk=job.pk).update(state='F')
+        self.assertEqual(render.claim(10), [job])
+        self.assertEqual(RenderJob.objects.get(pk=job.pk).attempts, 3)
+        # Out of attempts: failed stays failed, and a dead worker's job fails.
+        RenderJob.objects.filter(pk=job.pk).update(state='F')
+        self.assertEqual(render.claim(10), [])
+        RenderJob.objects.filter(pk=job.pk).update(
+            state='R',
+            modified_at=timezone.now() - timedelta(minutes=31)
+        )
+        self.assertEqual(render.claim(10), [])
+        self.assertEqual(RenderJob.objects.get(pk=job.pk).state, 'F')
+
+    def test_failure_only_fails_its_job(self):
+        good = Post.objects.create(title='Good', content='## Good', display_datetime=timezone.now())
+        bad = Post.objects.create(title='Bad', content='## bad', display_datetime=timezone.now())
+        with mock.patch('blog.pandoc.pandocify', side_effect=self.pandocify):
+            self.assertEqual(render.work(2), 2)
+        self.assertEqual(Post.objects.get(pk=good.pk).html, '<p>## Good</p>\n')
+        self.assertEqual(RenderJob.objects.get(post=good).state, 'D')
+        job = RenderJob.objects.get(post=bad)
+        self.assertEqual(job.state, 'F')
+        self.assertIn('pandoc failed', job.error)
+
+class RenderKeyTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch('blog.pandoc.pandoc_version', return_value='3.1')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.csl = os.path.join(media.name, 'apa.csl')
+        self.write_csl(b'<style/>')
+
+    def write_csl(self, content):
+        with open(self.csl, 'wb') as f:
+            f.write(content)
+        # file_digest is memoized on mtime, which may not have ticked.
+        mtime = os.path.getmtime(self.csl) + len(content)
+        os.utime(self.csl, (mtime, mtime))
+
+    def test_key_inputs(self):
+        key = pandoc.render_key('Text.', self.csl, 'abc')
+        self.assertEqual(pandoc.render_key('Text.', self.csl, 'abc'), key)
+        self.assertNotEqual(pandoc.render_key('Text!', self.csl, 'abc'), key)
+        self.assertNotEqual(pandoc.render_key('Text.', self.csl, 'abd'), key)
+        self.assertNotEqual(pandoc.render_key('Text.', None, 'abc'), key)
+        with mock.patch('blog.pandoc.pandoc_version', return_value='3.2'):
+            self.assertNotEqual(pandoc.render_key('Text.', self.csl, 'abc'), key)
+        self.write_csl(b'<style version="2"/>')
+        self.assertNotEqual(pandoc.render_key('Text.', self.csl, 'abc'), key)
+
+    @mock.patch('blog.pandoc.pandocify', side_effect=lambda content, csl, bib: '<p>%s</p>' % content)
+    def test_cache_invalidated(self, pandocify):
+        post = Post.objects.create(title='Post', content='Text.', display_datetime=timezone.now())
+        with mock.patch('blog.render.SiteWideSetting.render_args', return_value=(self.csl, None, None)):
+            self.assertEqual(render.render_posts([post]), ({post.pk: '<p>Text.</p>'}, {}))
+            render.render_posts([post])
+            self.assertEqual(pandocify.call_count, 1)
+            post.content = 'Edited.'
+            self.assertEqual(render.render_posts([post])[0], {post.pk: '<p>Edited.</p>'})
+            self.assertEqual(pandocify.call_count, 2)
+            self.write_csl(b'<style version="2"/>')
+            render.render_posts([post])
+            self.assertEqual(pandocify.call_count, 3)
+        self.assertEqual(RenderCache.objects.count(), 3)
+
+class RenderClaimLockTests(TransactionTestCase):
+    def test_claim_skips_locked_rows(self):
+        locked = Post.objects.create(title='Locked', content='Text.', display_datetime=timezone.now())
+        free = Post.objects.create(title='Free', content='Text.', display_datetime=timezone.now())
+        holding = threading.Event()
+        done = threading.Event()
+
+        def hold():
+            try:
+                with transaction.atomic():
+                    list(RenderJob.objects.select_for_update().filter(post=locked))
+                    holding.set()
+                    done.wait(10)
+            finally:
+                connection.close()
+        thread = threading.Thread(target=hold)
+        thread.start()
+        try:
+            holding.wait(10)
+            self.assertEqual([j.post_id for j in render.claim(10)], [free.pk])
+        finally:
+            done.set()
+            thread.join()
+        self.assertEqual([j.post_id for j in render.claim(10)], [locked.pk])
+
+class RerenderPostsTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.cited = Post.objects.create(title='Cited', content='As [@doe] says.', display_datetime=now)
+        self.code = Post.objects.create(title='Code', content='Use `[@property]`.', display_datetime=now)
+        self.old = Post.objects.create(title='Old', content='Plain.', display_datetime=now)
+        Post.objects.filter(pk=self.old.pk).update(modified_at=now - timedelta(days=30))
+
+    def rerender(self, **options):
+        out = StringIO()
+        call_command('rerender_posts', stdout=out, **options)
+        return out.getvalue().splitlines()
+
+    def test_dry_run(self):
+        self.assertEqual(self.rerender(dry_run=True, only_with_citations=True),
+            ['Cited', '1 post(s) would be rendered.'])
+        since = (timezone.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+        self.assertEqual(sorted(self.rerender(dry_run=True, since=since)[:-1]), ['Cited', 'Code'])
+        with self.assertRaises(CommandError):
+            self.rerender(dry_run=True, since='last week')
+        self.assertFalse(Post.objects.exclude(html='').exists())
+
+    @mock.patch('blog.management.commands.rerender_posts.ProcessPoolExecutor', ThreadPoolExecutor)
+    @mock.patch('blog.management.commands.rerender_posts.pandocify',
+        side_effect=lambda content, csl, bib: '<p>%s</p>' % content)
+    def test_render(self, pandocify):
+        self.rerender(workers=2)
+        self.assertEqual(Post.objects.get(pk=self.old.pk).html, '<p>Plain.</p>')
+        self.assertEqual(RenderCache.objects.count(), 3)
+
+    @mock.patch('blog.management.commands.rerender_posts.ProcessPoolExecutor', ThreadPoolExecutor)
+    @mock.patch('blog.management.commands.rerender_posts.pandocify', side_effect=RuntimeError('pandoc failed'))
+    def test_failure_names_post(self, pandocify):
+        with self.assertRaisesRegex(CommandError, "'Cited' failed: pandoc failed"):
+            self.rerender(workers=1, only_with_citations=True)
+        self.assertFalse(RenderCache.objects.exists())
+
+class CitekeyTests(SimpleTestCase):
+    def test_citation_syntax(self):
+        cases = [
+            ('[see @doe, p. 33; also @roe_2020]', {'doe', 'roe_2020'}),
+            ('[-@smith2004] says so.', {'smith2004'}),
+            ('@{weird key/2020}!', {'weird key/2020'}),
+            ('As @doe:2020. argues (@roe).', {'doe:2020', 'roe'}),
+            ('Mail jane@example.com or x@y.', set()),
+        ]
+        for content, keys in cases:
+            self.assertEqual(pandoc.citekeys(content), keys, content)
+
+    def test_code_is_not_cited(self):
+        content = (
+            "Python's `@property` and ``a ` @x`` are code.\n\n"
+            "```python\n@decorator\ndef f(): pass\n```\n\n"
+            "But [@doe] is cited.\n\n"
+            "~~~\n@unclosed\n"
+        )
+        self.assertEqual(pandoc.citekeys(content), {'doe'})
+
+class CitationStyleRenderTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_replacing_site_csl_queues_citing_posts(self):
+        csl = CitationStyle.objects.create(name='APA', file=SimpleUploadedFile('apa.csl', b'<style/>'))
+        other = CitationStyle.objects.create(name='MLA', file=SimpleUploadedFile('mla.csl', b'<style/>'))
+        person = Person.objects.create(first='Jane', last='Doe')
+        SiteWideSetting.objects.create(main_person=person, csl=csl)
+        citing = Post.objects.create(title='Cites', content='As [@doe] says.', display_datetime=timezone.now())
+        Post.objects.create(title='Plain', content='No citations.', display_datetime=timezone.now())
+        RenderJob.objects.all().delete()
+        other.file = SimpleUploadedFile('mla.csl', b'<style version="2"/>')
+        other.save()
+        self.assertFalse(RenderJob.objects.exists())
+        csl.file = SimpleUploadedFile('apa.csl', b'<style version="2"/>')
+        csl.save()
+        self.assertEqual(list(RenderJob.objects.values_list('post_id', flat=True)), [citing.pk])
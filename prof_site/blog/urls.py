@@ -7,4 +7,6 @@ urlpatterns = [
     path('post/<slug:slug>/', views.PostDetailView.as_view(), name='post_detail'),
     path('person/<slug:slug>/', views.PersonDetailView.as_view(), name='person_detail'),
     path('api/vita/', views.vita_view, name='vita_json'),
+    path('api/uploads/', views.upload_start, name='upload_start'),
+    path('api/uploads/<uuid:token>/', views.upload_detail, name='upload_detail'),
 ]
@@ -4,77 +4,112 @@ from django.views import generic
 from django.views.decorators.csrf import csrf_exempt
 from django.core.serializers import serialize
 from el_pagination.decorators import page_template
-from django.db.models import F
-from .models import SiteWideSetting, Post, Person, UrbanArea, Land, Event, Education, Affiliation, Award
+from .models import ChunkedUpload, Post, Person, UrbanArea, Land, Event
 from django.http import HttpResponse, JsonResponse
-from .serializers import EducationSerializer, InstitutionSerializer, MainPersonSerializer, AffiliationSerializer, AwardSerializer
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+from django.utils.text import get_valid_filename
+from django.views.decorators.http import require_http_methods, require_POST, require_safe
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from calendar import timegm
+from . import vita
+import json
+import os
 
 from datetime import datetime, timedelta, time
 from el_pagination.views import AjaxListView
 
+@require_safe
 def vita_view(request):
+    """
+    Serves the precomputed vita document. Conditional requests are
+    answered from the cache alone.
+    """
     try:
-        main_person_id = SiteWideSetting.objects.all()[0].main_person.id
-        main_person = Person.objects.filter(
-                id=main_person_id
-            ).all()
-        education = Education.objects.filter(
-                show=True,
-                person__id=main_person_id
-            ).order_by(
-                F('end').desc(nulls_first=True)
-            )
-        appointments = Affiliation.objects.filter(
-                person__id=main_person_id,
-                show=True,
-                kind='App',
-            ).order_by(
-                F('primary').desc(),
-                F('end').desc(nulls_first=True),
-            )
-        affiliations = Affiliation.objects.filter(
-                person__id=main_person_id,
-                show=True,
-                kind='Aff',
-                end=None
-            ).order_by(
-                F('end').desc(nulls_first=True)
-            )
-        funding = Award.objects.filter(
-                pi_awardee__id=main_person_id,
-                show=True,
-                kind='F'
-            ).order_by(F('start').desc(nulls_first=True))
-        awards = Award.objects.filter(
-                pi_awardee__id=main_person_id,
-                show=True,
-                kind='A'
-            ).order_by(F('start').desc(nulls_first=True))
-        advisees = Education.objects.filter(
-                committee__id__exact=main_person_id
-            ).order_by(
-                F('end').desc(nulls_first=True)
-            )
-    except Education.DoesNotExist or Person.DoesNotExist or Affiliation.DoesNotExist or Award.DoesNotExist:
+        document = vita.document()
+    except (IndexError, ObjectDoesNotExist):
         return HttpResponse(status=404)
-    
-    if request.method == 'GET':
-        main_s = MainPersonSerializer(main_person, many=True)
-        appointments_s = AffiliationSerializer(appointments, many=True)
-        education_s = EducationSerializer(education, many=True)
-        affiliations_s = AffiliationSerializer(affiliations, many=True)
-        funding_s = AwardSerializer(funding, many=True)
-        awards_s = AwardSerializer(awards, many=True)
-        advisees_s = EducationSerializer(advisees, many=True)
-        return JsonResponse({
-            'main': main_s.data[0],
-            'appointments': appointments_s.data,
-            'education': education_s.data,
-            'affiliations': affiliations_s.data,
-            'funding': funding_s.data,
-            'awards': awards_s.data,
-            'advisees': advisees_s.data
-            }, safe=False)
+    last_modified = timegm(document['last_modified'].utctimetuple())
+    response = get_conditional_response(request, etag=document['etag'], last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(document['body'], content_type='application/json')
+    response['ETag'] = document['etag']
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+def upload_status(upload, status=200):
+    data = upload.status()
+    data['url'] = reverse('blog:upload_detail', args=[upload.token])
+    return JsonResponse(data, status=status)
+
+@require_POST
+def upload_start(request):
+    """
+    Starts a chunked upload. Expects a JSON body with `filename`,
+    `size` and, optionally, the `sha256` of the whole file.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': "Staff only."}, status=403)
+    try:
+        data = json.loads(request.body)
+        filename = get_valid_filename(os.path.basename(data['filename']))
+        size = int(data['size'])
+        checksum = str(data.get('sha256') or '')
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': "Expected filename and size."}, status=400)
+    if not filename or size < 0 or len(checksum) > 64:
+        return JsonResponse({'error': "Invalid filename, size or checksum."}, status=400)
+    if size > settings.UPLOAD_MAX_SIZE:
+        return JsonResponse({'error': "File is too large."}, status=413)
+    ChunkedUpload.expire()
+    upload = ChunkedUpload(user=request.user, filename=filename, size=size, sha256=checksum)
+    upload.start()
+    if size == 0:
+        upload.finish()
+    upload.save()
+    return upload_status(upload, status=201)
+
+@require_http_methods(['GET', 'HEAD', 'PATCH'])
+def upload_detail(request, token):
+    """
+    GET reports how far an upload got, so the client can resume.
+    PATCH appends the request body at the `Upload-Offset` header,
+    optionally verified against `Upload-Checksum: sha256 <hex>`. The
+    body is streamed to disk rather than read into memory.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': "Staff only."}, status=403)
+    upload = get_object_or_404(ChunkedUpload, token=token, user=request.user)
+    if request.method != 'PATCH':
+        return upload_status(upload)
+    try:
+        offset = int(request.headers['Upload-Offset'])
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except (KeyError, ValueError):
+        return JsonResponse({'error': "Upload-Offset and Content-Length are required."}, status=400)
+    if length > settings.UPLOAD_CHUNK_SIZE:
+        return JsonResponse({'error': "Chunk is larger than UPLOAD_CHUNK_SIZE."}, status=413)
+    algorithm, _, checksum = request.headers.get('Upload-Checksum', '').partition(' ')
+    if checksum and algorithm != 'sha256':
+        return JsonResponse({'error': "Only sha256 checksums are supported."}, status=400)
+    with transaction.atomic():
+        # Locked, so two connections cannot write the same upload at once.
+        upload = ChunkedUpload.objects.select_for_update().get(pk=upload.pk)
+        if upload.state != 'U' or offset != upload.offset:
+            return upload_status(upload, status=409)
+        if offset + length > upload.size:
+            return JsonResponse({'error': "Chunk runs past the declared size."}, status=400)
+        try:
+            upload.write_chunk(request, length, checksum)
+        except ValueError as e:
+            return JsonResponse(dict(upload.status(), error=str(e)), status=400)
+        upload.save()
+    if upload.state == 'F':
+        return JsonResponse(dict(upload.status(), error="File checksum mismatch."), status=400)
+    return upload_status(upload)
 
 class IndexView(AjaxListView):
     context_object_name = 'latest_post_list'
@@ -82,18 +117,28 @@ class IndexView(AjaxListView):
     page_template = 'blog/post_list_page.html'
 
     def get_queryset(self):
-        """Return the last ten published posts."""
-        return Post.objects.order_by('-display_datetime')[1:]
+        """Return the published posts after the lead post, with their authors."""
+        return Post.objects.defer('content').prefetch_related('authors').order_by('-display_datetime')[1:]
 
     def get_context_data(self, **kwargs):
         today = datetime.now().date()
         context = super(IndexView, self).get_context_data(**kwargs)
-        context['first'] = Post.objects.order_by('-display_datetime')[0]
-        context['events'] = Event.objects.filter(day__gte=today).order_by('day', 'start')
+        if self.request.is_ajax():
+            # Infinite-scroll pages only render page_template.
+            return context
+        context['first'] = Post.objects.defer('content').prefetch_related('authors').order_by('-display_datetime').first()
+        context['events'] = Event.objects.filter(
+                day__gte=today
+            ).select_related(
+                'conference__conference'
+            ).prefetch_related(
+                'conference__conference__organizations', 'sponsors'
+            ).order_by('day', 'start')
         return context
 
 class PostDetailView(generic.DetailView):
     model = Post
+    queryset = Post.objects.defer('content')
     template_name = 'blog/post_detail.html'
     context_object_name = 'post_detail'
 
@@ -0,0 +1,287 @@
+import json
+from hashlib import sha256
+from django.core.cache import cache
+from django.db.models import F, Max, Prefetch
+from django.utils import timezone
+from .models import SiteWideSetting, Person, Education, Affiliation, Award, Institution, Committee_Membership
+from .serializers import EducationSerializer, MainPersonSerializer, AffiliationSerializer, AwardSerializer
+
+VITA_KEY = 'blog:vita'
+VITA_DELETED_KEY = 'blog:vita:deleted'
+
+# Models whose rows appear in the vita.
+VITA_MODELS = [SiteWideSetting, Person, Education, Affiliation, Award, Institution, Committee_Membership]
+
+def vita_querysets():
+    """
+    The main person and the filtered, ordered querysets making up the
+    vita. Both serialization paths start from these, so they agree on
+    row order (pk breaks ties).
+    """
+    main_person_id = SiteWideSetting.objects.values_list('main_person_id', flat=True)[0]
+    return {
+        'main': Person.objects.filter(
+                id=main_person_id
+            ),
+        'appointments': Affiliation.objects.filter(
+                person__id=main_person_id,
+                show=True,
+                kind='App',
+            ).order_by(
+                F('primary').desc(),
+                F('end').desc(nulls_first=True),
+                'pk'
+            ),
+        'education': Education.objects.filter(
+                show=True,
+                person__id=main_person_id
+            ).order_by(
+                F('end').desc(nulls_first=True),
+                'pk'
+            ),
+        'affiliations': Affiliation.objects.filter(
+                person__id=main_person_id,
+                show=True,
+                kind='Aff',
+                end=None
+            ).order_by(
+                F('end').desc(nulls_first=True),
+                'pk'
+            ),
+        'funding': Award.objects.filter(
+                pi_awardee__id=main_person_id,
+                show=True,
+                kind='F'
+            ).order_by(F('start').desc(nulls_first=True), 'pk'),
+        'awards': Award.objects.filter(
+                pi_awardee__id=main_person_id,
+                show=True,
+                kind='A'
+            ).order_by(F('start').desc(nulls_first=True), 'pk'),
+        'advisees': Education.objects.filter(
+                committee__id__exact=main_person_id
+            ).order_by(
+                F('end').desc(nulls_first=True),
+                'pk'
+            ),
+    }
+
+def vita_data():
+    """
+    Builds the vita payload for the main person through the DRF
+    serializers. Kept as the reference for fast_vita_data().
+    """
+    qs = vita_querysets()
+    committee = Prefetch('committee', queryset=Person.objects.order_by('pk'))
+    grantees = Prefetch('grantees', queryset=Institution.objects.order_by('pk'))
+    education, advisees = [
+        list(qs[k].select_related('institution').prefetch_related(committee))
+        for k in ('education', 'advisees')
+    ]
+    appointments, affiliations = [
+        list(qs[k].select_related('institution')) for k in ('appointments', 'affiliations')
+    ]
+    funding, awards = [
+        list(qs[k].select_related('grantor').prefetch_related(grantees)) for k in ('funding', 'awards')
+    ]
+    # One query for every parent chain the serializers will walk.
+    Institution.attach_ancestors(
+        [e.institution for e in education + advisees]
+        + [a.institution for a in appointments + affiliations]
+        + [a.grantor for a in funding + awards]
+        + [g for a in funding + awards for g in a.grantees.all()]
+    )
+    main_s = MainPersonSerializer(qs['main'], many=True)
+    appointments_s = AffiliationSerializer(appointments, many=True)
+    education_s = EducationSerializer(education, many=True)
+    affiliations_s = AffiliationSerializer(affiliations, many=True)
+    funding_s = AwardSerializer(funding, many=True)
+    awards_s = AwardSerializer(awards, many=True)
+    advisees_s = EducationSerializer(advisees, many=True)
+    return {
+        'main': main_s.data[0],
+        'appointments': appointments_s.data,
+        'education': education_s.data,
+        'affiliations': affiliations_s.data,
+        'funding': funding_s.data,
+        'awards': awards_s.data,
+        'advisees': advisees_s.data
+    }
+
+# Field orders below mirror what the DRF serializers emit: declared
+# fields first, then the remaining model fields in definition order.
+INSTITUTION_FIELDS = ['name', 'address', 'room', 'city', 'state', 'postal', 'country', 'website']
+PERSON_FIELDS = ['email', 'bio', 'website', 'photo', 'orcid', 'pgp', 'twitter', 'gitlab',
+    'github', 'zotero', 'linkedin', 'slug', 'vita']
+GENDERS = dict(Person.GENDERS)
+CREDS = dict(Person.CREDS)
+DEGREES = dict(Education.DEGREES)
+
+def _year(value):
+    return value.strftime('%Y') if value else None
+
+def _file_url(field, name):
+    return Person._meta.get_field(field).storage.url(name) if name else None
+
+def _institutions(ids):
+    """
+    Nested institution dicts (parent first, as InstitutionSerializer
+    emits them) for the given primary keys and all their ancestors.
+    """
+    fields = ['id', 'parent_id', 'path'] + INSTITUTION_FIELDS
+    rows = {r['id']: r for r in Institution.objects.filter(pk__in=ids - {None}).values(*fields)}
+    # Ancestors come from the materialized paths; the loop only runs
+    # again if a path is out of step with parent.
+    missing = {int(pk) for r in rows.values() for pk in r['path'].split('/')[:-1]}
+    missing |= {r['parent_id'] for r in rows.values() if r['parent_id']}
+    missing -= set(rows)
+    while missing:
+        fetched = {r['id']: r for r in Institution.objects.filter(pk__in=missing).values(*fields)}
+        rows.update(fetched)
+        missing = {r['parent_id'] for r in fetched.values() if r['parent_id']} - set(rows)
+    built = {}
+    def build(pk):
+        if pk is None or pk not in rows:
+            return None
+        if pk not in built:
+            row = rows[pk]
+            d = {'parent': build(row['parent_id'])}
+            for f in INSTITUTION_FIELDS:
+                d[f] = row[f]
+            built[pk] = d
+        return built[pk]
+    return build
+
+def fast_vita_data():
+    """
+    Builds the same payload as vita_data() from .values() rows, skipping
+    DRF's per-field machinery.
+    """
+    qs = vita_querysets()
+    main = qs['main'].values('first', 'middle', 'last', 'pronouns', 'cred', *PERSON_FIELDS)[0]
+    education = list(qs['education'].values())
+    advisees = list(qs['advisees'].values())
+    appointments = list(qs['appointments'].values())
+    affiliations = list(qs['affiliations'].values())
+    funding = list(qs['funding'].values())
+    awards = list(qs['awards'].values())
+
+    committees = {}
+    for m in Committee_Membership.objects.filter(
+            education_id__in=[e['id'] for e in education + advisees]
+        ).order_by('person_id').values(
+            'education_id', 'person__first', 'person__middle', 'person__last',
+            'person__website', 'person__email', 'person__cred'
+        ):
+        committees.setdefault(m['education_id'], []).append({
+            'name': Person.join_name(m['person__first'], m['person__middle'], m['person__last']),
+            'website': m['person__website'],
+            'email': m['person__email'],
+            'cred': CREDS.get(m['person__cred'], m['person__cred']),
+        })
+    grantees = {}
+    for award_id, institution_id in Award.grantees.through.objects.filter(
+            award_id__in=[a['id'] for a in funding + awards]
+        ).order_by('institution_id').values_list('award_id', 'institution_id'):
+        grantees.setdefault(award_id, []).append(institution_id)
+    institution = _institutions(
+        {e['institution_id'] for e in education + advisees + appointments + affiliations}
+        | {a['grantor_id'] for a in funding + awards}
+        | {pk for ids in grantees.values() for pk in ids}
+    )
+
+    def education_dict(e):
+        return {
+            'start': _year(e['start']),
+            'end': _year(e['end']),
+            'institution': institution(e['institution_id']),
+            'committee': committees.get(e['id'], []),
+            'degree': DEGREES.get(e['degree'], e['degree']),
+            'concentration': e['concentration'],
+            'thesis_title': e['thesis_title'],
+            'thesis_link': e['thesis_link'],
+            'thesis_type': e['thesis_type'],
+            'desc': e['desc'],
+            'person': e['person_id'],
+        }
+    def affiliation_dict(a):
+        return {
+            'start': _year(a['start']),
+            'end': _year(a['end']),
+            'institution': institution(a['institution_id']),
+            'email': a['email'],
+            'title': a['title'],
+            'website': a['website'],
+            'desc': a['desc'],
+        }
+    def award_dict(a):
+        return {
+            'grantor': institution(a['grantor_id']),
+            'grantees': [institution(pk) for pk in grantees.get(a['id'], [])],
+            'start': _year(a['start']),
+            'end': _year(a['end']),
+            'name': a['name'],
+            'amount': a['amount'],
+            'currency': a['currency'],
+            'pi_awardee': a['pi_awardee_id'],
+        }
+
+    person = {
+        'full_name': Person.join_name(main['first'], main['middle'], main['last']),
+        'pronouns': GENDERS.get(main['pronouns'], main['pronouns']),
+        'cred': CREDS.get(main['cred'], main['cred']),
+    }
+    for f in PERSON_FIELDS:
+        person[f] = main[f]
+    person['photo'] = _file_url('photo', main['photo'])
+    person['vita'] = _file_url('vita', main['vita'])
+    return {
+        'main': person,
+        'appointments': [affiliation_dict(a) for a in appointments],
+        'education': [education_dict(e) for e in education],
+        'affiliations': [affiliation_dict(a) for a in affiliations],
+        'funding': [award_dict(a) for a in funding],
+        'awards': [award_dict(a) for a in awards],
+        'advisees': [education_dict(e) for e in advisees]
+    }
+
+def last_modified():
+    """
+    Latest modification time across the models making up the vita.
+    Deletions and grantee changes leave no modified_at behind, so their
+    time is recorded separately by invalidate().
+    """
+    times = [m.objects.aggregate(t=Max('modified_at'))['t'] for m in VITA_MODELS]
+    times.append(cache.get(VITA_DELETED_KEY))
+    return max([t for t in times if t is not None], default=timezone.now())
+
+def rebuild():
+    """
+    Serializes the vita (byte for byte as JsonResponse would) and stores it in
+    the shared cache, with a strong ETag and its Last-Modified time.
+    """
+    body = json.dumps(fast_vita_data()).encode('utf-8')
+    document = {
+        'body': body,
+        'etag': '"{}"'.format(sha256(body).hexdigest()),
+        'last_modified': last_modified(),
+    }
+    cache.set(VITA_KEY, document, None)
+    return document
+
+def document():
+    """
+    Returns the stored vita document, building it if there is none.
+    """
+    return cache.get(VITA_KEY) or rebuild()
+
+def invalidate(untracked=False):
+    """
+    Drops the stored document so no stale copy is served. Pass
+    untracked=True for changes that leave no modified_at behind
+    (deletions, grantees added or removed), so last_modified() still
+    moves forward.
+    """
+    if untracked:
+        cache.set(VITA_DELETED_KEY, timezone.now(), None)
+    cache.delete(VITA_KEY)
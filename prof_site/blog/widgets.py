@@ -0,0 +1,72 @@
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.urls import reverse
+from .models import ChunkedUpload
+
+
+class ChunkedUploadFile(File):
+    """
+    A completed chunked upload handed to a FileField. Like Django's
+    TemporaryUploadedFile it exposes temporary_file_path(), so
+    FileSystemStorage moves the partial file into place instead of
+    copying it. The file is only opened if something reads it.
+    """
+    def __init__(self, upload):
+        super(ChunkedUploadFile, self).__init__(None, name=upload.filename)
+        self.upload = upload
+        self.size = upload.size
+
+    def temporary_file_path(self):
+        return self.upload.part_path
+
+    def open(self, mode='rb'):
+        if self.closed:
+            self.file = open(self.upload.part_path, mode)
+        else:
+            self.seek(0)
+        return self
+
+    def chunks(self, chunk_size=None):
+        self.open()
+        return super(ChunkedUploadFile, self).chunks(chunk_size)
+
+class ChunkedFileWidget(forms.ClearableFileInput):
+    """
+    File input that uploads in resumable chunks (see
+    blog/js/chunked_upload.js) and submits only the upload token with
+    the form. Without JavaScript it behaves as a plain file input.
+    """
+    template_name = 'blog/widgets/chunked_file.html'
+
+    class Media:
+        js = ('blog/js/chunked_upload.js',)
+
+    def get_context(self, name, value, attrs):
+        context = super(ChunkedFileWidget, self).get_context(name, value, attrs)
+        context['widget']['upload_url'] = reverse('blog:upload_start')
+        context['widget']['chunk_size'] = settings.UPLOAD_CHUNK_SIZE
+        # Keeps a finished upload across a form that failed validation.
+        context['widget']['upload'] = getattr(self, 'upload', None)
+        return context
+
+    def value_from_datadict(self, data, files, name):
+        """
+        The finished upload a submitted token names, whoever uploaded
+        it: ChunkedUploadForm.clean checks it belongs to the user.
+        """
+        token = data.get(name + '_upload')
+        self.token = token
+        self.upload = None
+        if token:
+            try:
+                self.upload = ChunkedUpload.objects.filter(token=token, state='C').first()
+            except ValidationError:
+                pass
+            if self.upload:
+                return ChunkedUploadFile(self.upload)
+        return super(ChunkedFileWidget, self).value_from_datadict(data, files, name)
+
+    def value_omitted_from_data(self, data, files, name):
+        return not data.get(name + '_upload') and super(ChunkedFileWidget, self).value_omitted_from_data(data, files, name)
@@ -1,34 +1,222 @@
-from pyzotero import zotero
 import os
+import time
 import bibtexparser
+import json
+import requests
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import chain, islice
+from hashlib import sha256
 from django.conf import settings
 
-def zotero_version(library_id, library_type, library_collection_id):
-    zot = zotero.Zotero(library_id, library_type, settings.ZOTERO_KEY)
+def bib_file_name(library_id, library_collection_id):
+    """
+    Path, relative to MEDIA_ROOT, of a library's BibTeX file.
+    """
     if library_collection_id:
-        version = zot.collection(library_collection_id)['version']
+        file_name = '_'.join(['collection', str(library_id), str(library_collection_id)])
     else:
-        version = zot.items(limit=1)[0]['version']
-    return version
+        file_name = '_'.join(['library', str(library_id)])
+    return '/'.join(['bibs', '.'.join([file_name, 'bib'])])
 
-def zotero_pull(library_id, library_type, library_collection_id):
-    # Create Zotero object.
-    zot = zotero.Zotero(library_id, library_type, settings.ZOTERO_KEY)
-    if library_collection_id:
-        prefix = 'collection'
-        version = zot.collection(library_collection_id)['version']
-        file_name = '_'.join([prefix, str(library_id), str(library_collection_id)])
-        zot.add_parameters(format = 'bibtex')
-        results = zot.everything(zot.collection_items(library_collection_id))
+def _history(path, n):
+    return '%s.%d' % (path, n)
+
+def _fsync_dir(path):
+    fd = os.open(os.path.dirname(path), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+@contextmanager
+def atomic_write(path, keep=0):
+    """
+    Opens a temporary file beside `path` for writing; on success it is
+    fsynced and renamed over `path`, so readers see either the old file
+    or the new one, never a partial write. The `keep` previous versions
+    stay alongside as path.1 (newest) ... path.N, hard-linked so that
+    rotation copies nothing.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Unique per call: sync threads share a process, so a pid won't do.
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            # mkstemp creates files only the owner can read.
+            os.chmod(tmp, settings.FILE_UPLOAD_PERMISSIONS or 0o644)
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        if keep and os.path.exists(path):
+            for n in range(keep, 1, -1):
+                if os.path.exists(_history(path, n - 1)):
+                    os.replace(_history(path, n - 1), _history(path, n))
+            if os.path.exists(_history(path, 1)):
+                os.remove(_history(path, 1))
+            os.link(path, _history(path, 1))
+        os.replace(tmp, path)
+        _fsync_dir(path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def restore_previous(path, keep):
+    """
+    Moves path.1 back into place (an atomic rename) and shifts the
+    older versions down. Returns False when there is nothing to restore.
+    """
+    if not os.path.exists(_history(path, 1)):
+        return False
+    os.replace(_history(path, 1), path)
+    for n in range(2, keep + 1):
+        if os.path.exists(_history(path, n)):
+            os.replace(_history(path, n), _history(path, n - 1))
+    _fsync_dir(path)
+    return True
+
+class RateLimit:
+    """
+    Pause shared by every thread fetching one sync's pages, so a
+    Retry-After or Backoff from Zotero holds back the whole pool rather
+    than only the thread that got it.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.until = 0
+
+    def pause(self, seconds):
+        with self.lock:
+            self.until = max(self.until, time.monotonic() + seconds)
+
+    def wait(self):
+        while True:
+            with self.lock:
+                delay = self.until - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+def zotero_get(session, url, params=None, rate_limit=None):
+    """
+    GET a Zotero API url, waiting out rate limiting (429/503 with
+    Retry-After) and honoring the Backoff header. Raises once a request
+    has been rate limited ZOTERO_RETRIES times.
+    """
+    rate_limit = rate_limit or RateLimit()
+    for attempt in range(settings.ZOTERO_RETRIES + 1):
+        rate_limit.wait()
+        response = session.get(url, params=params)
+        retry = response.headers.get('Retry-After')
+        if response.status_code in (429, 503) and retry:
+            rate_limit.pause(float(retry))
+            continue
+        response.raise_for_status()
+        backoff = response.headers.get('Backoff')
+        if backoff:
+            rate_limit.pause(float(backoff))
+        return response
+    response.raise_for_status()
+
+def zotero_pages(session, url, params, workers=4, limit=100, rate_limit=None):
+    """
+    Yields each page of a paginated Zotero request, in order.
+    The first page gives the total result count; the remaining pages
+    are fetched concurrently, never more than `workers` at a time, so
+    pages are consumed as they arrive rather than held in memory.
+    """
+    rate_limit = rate_limit or RateLimit()
+    params = dict(params, limit=limit, start=0)
+    first = zotero_get(session, url, params, rate_limit)
+    yield first
+    total = int(first.headers.get('Total-Results', 0))
+    starts = iter(range(limit, total, limit))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque(
+            pool.submit(zotero_get, session, url, dict(params, start=start), rate_limit)
+            for start in islice(starts, workers)
+        )
+        while pending:
+            page = pending.popleft().result()
+            for start in islice(starts, 1):
+                pending.append(pool.submit(zotero_get, session, url, dict(params, start=start), rate_limit))
+            yield page
+
+def zotero_changes(library_id, library_type, library_collection_id, since):
+    """
+    Fetches the items modified after library version `since` (every item
+    when `since` is 0), each with its BibTeX export.
+    Returns (version, changes), where changes yields (item key, bibtex)
+    as pages arrive, with bibtex None for items deleted (or dropped from
+    the collection) since then.
+    """
+    session = requests.Session()
+    session.headers.update({'Zotero-API-Version': '3'})
+    if settings.ZOTERO_KEY:
+        session.headers['Authorization'] = 'Bearer ' + settings.ZOTERO_KEY
+    library = '/'.join([settings.ZOTERO_ENDPOINT, library_type + 's', str(library_id)])
+    params = {'format': 'json', 'include': 'bibtex,data'}
+    if since:
+        # Items leaving a collection aren't reported against the
+        # collection, so incremental syncs read library-wide changes.
+        url = library + '/items'
+        params['since'] = since
+    elif library_collection_id:
+        url = library + '/collections/' + library_collection_id + '/items'
     else:
-        prefix = 'library'
-        version = zot.items(limit=1)[0]['version']
-        file_name = '_'.join([prefix, str(library_id)])
-        zot.add_parameters(format = 'bibtex')
-        results = zot.everything(zot.items())
-    bib_file = '.'.join([file_name, 'bib'])
-    bib_file_rel_path = '/'.join(['bibs', bib_file])
-    bib_file_path = os.path.join(settings.MEDIA_ROOT, 'bibs', bib_file)
-    with open(bib_file_path, 'w') as bibtex_file:
-        bibtexparser.dump(results, bibtex_file)
-    return (version, bib_file_rel_path)
\ No newline at end of file
+        url = library + '/items'
+    rate_limit = RateLimit()
+    pages = zotero_pages(session, url, params, workers=settings.ZOTERO_WORKERS, rate_limit=rate_limit)
+    first = next(pages)
+    version = int(first.headers.get('Last-Modified-Version', 0))
+
+    def changes():
+        for page in chain([first], pages):
+            for item in page.json():
+                data = item.get('data', {})
+                if data.get('itemType') in ('attachment', 'note'):
+                    continue
+                if data.get('deleted') or (
+                        library_collection_id and library_collection_id not in data.get('collections', [])
+                    ):
+                    yield (item['key'], None)
+                else:
+                    yield (item['key'], item.get('bibtex', ''))
+        if since:
+            deleted = zotero_get(session, library + '/deleted', {'since': since}, rate_limit)
+            for item_key in deleted.json().get('items', []):
+                yield (item_key, None)
+
+    return (version, changes())
+
+def bibtex_entries(bibtex):
+    """
+    Yields (citekey, digest, bibtex) for each entry in a BibTeX string,
+    hashing the parsed fields so successive syncs can be diffed entry by
+    entry.
+    """
+    parser = bibtexparser.bparser.BibTexParser(common_strings=True)
+    database = bibtexparser.loads(bibtex, parser=parser)
+    writer = bibtexparser.bwriter.BibTexWriter()
+    for entry in database.entries:
+        single = bibtexparser.bibdatabase.BibDatabase()
+        single.entries = [entry]
+        yield (
+            entry['ID'],
+            sha256(json.dumps(entry, sort_keys=True).encode('utf-8')).hexdigest(),
+            writer.write(single)
+        )
+
+def bib_entries(bib_file_path):
+    """
+    Maps each citekey in a BibTeX file to its digest and BibTeX.
+    """
+    with open(bib_file_path) as bibtex_file:
+        return {
+            key: (digest, bibtex)
+            for key, digest, bibtex in bibtex_entries(bibtex_file.read())
+        }
@@ -11,7 +11,6 @@ https://docs.djangoproject.com/en/2.1/ref/settings/
 """
 
 import os
-from datetime import datetime
 from pathlib import Path
 # Load environment variables from .env file
 from dotenv import load_dotenv
@@ -27,8 +26,27 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SECRET_KEY = os.getenv('SECRET_KEY')
 # ZOTERO KEY
 ZOTERO_KEY = os.getenv('ZOTERO_KEY')
+# ZOTERO API (override to point syncs at a local stub)
+ZOTERO_ENDPOINT = os.getenv('ZOTERO_ENDPOINT', 'https://api.zotero.org')
+# Concurrent page requests per Zotero sync
+ZOTERO_WORKERS = 4
+# Times a rate-limited Zotero request is retried before the sync fails
+ZOTERO_RETRIES = 5
+# Previous bibliography files kept for rollback
+BIB_HISTORY = 3
+# Minutes before a running Zotero sync is presumed dead and re-queued
+SYNC_TIMEOUT = 30
+# Minutes before a running post render is presumed dead and re-queued
+RENDER_TIMEOUT = 30
+# Times a post render is attempted before its job is left failed
+RENDER_ATTEMPTS = 3
 # OPENCAGE KEY
 OPENCAGE_KEY = os.getenv('OPENCAGE_KEY')
+# OPENCAGE API (override to point geocoding at a local stub)
+OPENCAGE_URL = os.getenv('OPENCAGE_URL', 'https://api.opencagedata.com/geocode/v1/json')
+# Days geocoding results (and failed lookups) are cached
+GEOCODE_TTL = 365
+GEOCODE_NEGATIVE_TTL = 7
 
 # Starting with Django 3.2, can set the type for automatically
 # generated primary key fields.
@@ -111,6 +129,16 @@ DATABASES = {
     }
 }
 
+# Shared by all worker processes. Holds the precomputed vita document
+# (blog/vita.py) and the sitewide settings version (blog/sitewide.py);
+# clearing it on deploy just makes both rebuild on the next request.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache/'),
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
@@ -150,17 +178,34 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
 STATIC_URL = '/static/'
 MEDIA_URL = '/media/'
 
+# Uploads are stored once per distinct content, under sharded hash paths
+DEFAULT_FILE_STORAGE = 'blog.storage.ContentAddressedStorage'
+# Imagekit looks cache files up by name, so they keep plain storage;
+# they are named after the source's content hash instead.
+IMAGEKIT_DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
+IMAGEKIT_SPEC_CACHEFILE_NAMER = 'blog.storage.content_namer'
 
-MARKDOWNX_MEDIA_PATH = datetime.now().strftime('markdownx/%Y/%m/%d')
+MARKDOWNX_MEDIA_PATH = 'markdownx/'
 # Maximum 3 MB upload size.
 MARKDOWNX_UPLOAD_MAX_SIZE =  15 * 1024 * 1024
 
 MARKDOWNX_IMAGE_MAX_SIZE = { 'size': (600, 0), 'quality': 90 }
 
+# Widths of the responsive variants generated for banners and photos
+IMAGE_WIDTHS = [320, 640, 1024, 1920]
+# Minutes before images claimed by a dead worker are generated again
+IMAGE_TIMEOUT = 30
+
 STATICFILES_FINDERS = [
     'django.contrib.staticfiles.finders.FileSystemFinder',
     'django.contrib.staticfiles.finders.AppDirectoriesFinder',
 ]
 
-FILE_UPLOAD_MAX_MEMORY_SIZE = 214958080
-DATA_UPLOAD_MAX_MEMORY_SIZE = 214958080
+# Keep request bodies out of memory; large files arrive through the
+# chunked upload endpoint (blog:upload_start) one chunk at a time.
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440
+DATA_UPLOAD_MAX_MEMORY_SIZE = 2621440
+UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024
+UPLOAD_MAX_SIZE = 2 * 1024 * 1024 * 1024
+# Days before unfinished or unused chunked uploads are removed
+UPLOAD_EXPIRY = 2